@@ -0,0 +1,109 @@
+# benchmarks/broadcast_serialization.py
+"""
+Measure CPU time per room broadcast as room size grows.
+
+Both runs go through the same outbound queues. The legacy run serializes
+the message once per recipient, as ``send_json`` used to. The current run
+has ConnectionManager encode the frame once and share it with every
+recipient.
+
+Usage:
+    python -m benchmarks.broadcast_serialization [--broadcasts 200] [--sizes 10 50 200 1000]
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import time
+
+from tools.connection_manager import ConnectionManager, SlowConsumerPolicy
+from tools.room_manager import RoomManager
+
+class NullWebSocket:
+    """WebSocket stand-in that accepts frames without doing any I/O."""
+    scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+def partial_message(index: int) -> dict:
+    return {
+        "type": "partial",
+        "text": f"this is partial transcript number {index} of the benchmark run",
+        "timestamp": datetime.now().isoformat(),
+        "is_final": False
+    }
+
+async def run_room(size: int, broadcasts: int) -> dict:
+    room_manager = RoomManager()
+    room = room_manager.create_room("host", max_participants=size)
+    policy = SlowConsumerPolicy(max_queue_size=broadcasts + 1, disconnect_threshold=broadcasts + 1)
+    manager = ConnectionManager(room_manager, policy=policy)
+    sockets = {"host": NullWebSocket()}
+    for index in range(size - 1):
+        user_id = f"guest{index}"
+        room_manager.join_room(room.code, user_id)
+        sockets[user_id] = NullWebSocket()
+    for user_id, websocket in sockets.items():
+        connection = await manager.connect(user_id, websocket)
+        manager.bind(connection, room, "host" if user_id == "host" else "guest")
+
+    messages = [partial_message(index) for index in range(broadcasts)]
+
+    async def drain():
+        while any(connection.depth for connection in manager.active_connections.values()):
+            await asyncio.sleep(0)
+
+    # Legacy serialization: json.dumps once per recipient (what send_json does)
+    start = time.process_time()
+    for message in messages:
+        for connection in manager.active_connections.values():
+            connection.enqueue(message["type"], json.dumps(message, separators=(",", ":"), ensure_ascii=False))
+        await asyncio.sleep(0)
+    await drain()
+    legacy = time.process_time() - start
+
+    # Current path: encode once, enqueue the shared frame, let sender tasks drain
+    start = time.process_time()
+    for message in messages:
+        await manager.broadcast_to_room(room.code, message)
+        await asyncio.sleep(0)
+    await drain()
+    shared = time.process_time() - start
+
+    for connection in list(manager.active_connections.values()):
+        manager.disconnect(connection)
+
+    return {
+        "room_size": size,
+        "legacy_us_per_broadcast": legacy / broadcasts * 1e6,
+        "encode_once_us_per_broadcast": shared / broadcasts * 1e6
+    }
+
+async def main(sizes, broadcasts):
+    results = []
+    for size in sizes:
+        results.append(await run_room(size, broadcasts))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--broadcasts", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.sizes, args.broadcasts))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'room size':>10} {'legacy us':>12} {'encode once us':>16}")
+        for result in results:
+            print(
+                f"{result['room_size']:>10} "
+                f"{result['legacy_us_per_broadcast']:>12.1f} "
+                f"{result['encode_once_us_per_broadcast']:>16.1f}"
+            )
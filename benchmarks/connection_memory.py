@@ -0,0 +1,156 @@
+# benchmarks/connection_memory.py
+"""
+Measure memory held per idle connection.
+
+The legacy run rebuilds the previous data model: a dict-backed Room with a
+datetime per member, a dict-backed connection object, and user-keyed side
+tables for sockets and languages. The current run goes through
+RoomManager and ConnectionManager, with slotted Room and ClientConnection
+records that carry the language and a float last-active time. Legacy
+connections hold the idle sender task every connection used to have;
+current ones only start a sender when something is queued.
+
+Usage:
+    python -m benchmarks.connection_memory [--connections 10000] [--room-size 50]
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Set
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+
+from tools.connection_manager import ConnectionManager, SlowConsumerPolicy
+from tools.room_manager import RoomManager
+
+LANGUAGES = ["es", "fr", "de", "ja"]
+
+class NullWebSocket:
+    """WebSocket stand-in that accepts frames without doing any I/O."""
+    scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+@dataclass
+class LegacyRoom:
+    code: str
+    host_id: str
+    created_at: datetime
+    guests: Set[str]
+    max_participants: int = 50
+    is_active: bool = True
+    user_last_active: Dict[str, datetime] = field(default_factory=dict)
+
+class LegacyConnection:
+    """The connection object before it was slotted, with the same fields it had then."""
+
+    def __init__(self, user_id: str, websocket, policy: SlowConsumerPolicy):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.policy = policy
+        self.on_slow_consumer = None
+        self.queue: deque = deque()
+        self.depth = 0
+        self.dropped = 0
+        self.closed = False
+        self._latest: Dict[str, object] = {}
+        self._wakeup = asyncio.Event()
+        self.sender_task = asyncio.create_task(self._run_sender())
+
+    async def _run_sender(self):
+        await self._wakeup.wait()
+
+def user_ids(connections: int, room_size: int):
+    """Yield (room index, user id, is host) for every connection."""
+    for index in range(connections):
+        room_index, position = divmod(index, room_size)
+        yield room_index, f"user{index}", position == 0
+
+async def build_legacy(connections: int, room_size: int) -> list:
+    policy = SlowConsumerPolicy()
+    rooms: Dict[str, LegacyRoom] = {}
+    user_to_room: Dict[str, str] = {}
+    sockets: Dict[str, NullWebSocket] = {}
+    active_connections: Dict[str, LegacyConnection] = {}
+    user_languages: Dict[str, str] = {}
+    for room_index, user_id, is_host in user_ids(connections, room_size):
+        code = f"R{room_index}"
+        if is_host:
+            rooms[code] = LegacyRoom(code=code, host_id=user_id, created_at=datetime.now(), guests=set(), max_participants=room_size)
+        else:
+            rooms[code].guests.add(user_id)
+            user_languages[user_id] = LANGUAGES[room_index % len(LANGUAGES)]
+        rooms[code].user_last_active[user_id] = datetime.now()
+        user_to_room[user_id] = code
+        sockets[user_id] = NullWebSocket()
+        active_connections[user_id] = LegacyConnection(user_id, sockets[user_id], policy)
+    await asyncio.sleep(0)
+    return [rooms, user_to_room, sockets, active_connections, user_languages]
+
+async def build_current(connections: int, room_size: int) -> list:
+    room_manager = RoomManager()
+    manager = ConnectionManager(room_manager)
+    rooms = {}
+    for room_index, user_id, is_host in user_ids(connections, room_size):
+        if is_host:
+            room = rooms[room_index] = room_manager.create_room(user_id, max_participants=room_size)
+        else:
+            room = room_manager.join_room(rooms[room_index].code, user_id)
+        connection = await manager.connect(user_id, NullWebSocket())
+        manager.bind(connection, room, "host" if is_host else "guest")
+        if not is_host:
+            connection.language = LANGUAGES[room_index % len(LANGUAGES)]
+    await asyncio.sleep(0)
+    manager.clock.stop()
+    return [room_manager, manager]
+
+async def measure(build, connections: int, room_size: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    state = await build(connections, room_size)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+    del state
+    return allocated
+
+async def main(connections: int, room_size: int) -> dict:
+    legacy = await measure(build_legacy, connections, room_size)
+    current = await measure(build_current, connections, room_size)
+    return {
+        "connections": connections,
+        "room_size": room_size,
+        "legacy_bytes": legacy,
+        "current_bytes": current,
+        "legacy_bytes_per_connection": legacy / connections,
+        "current_bytes_per_connection": current / connections,
+        "saved_percent": (1 - current / legacy) * 100 if legacy else 0.0
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--room-size", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args.connections, args.room_size))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'model':>8} {'total MB':>10} {'bytes/conn':>12}")
+        print(f"{'legacy':>8} {result['legacy_bytes'] / 1e6:>10.2f} {result['legacy_bytes_per_connection']:>12.0f}")
+        print(f"{'current':>8} {result['current_bytes'] / 1e6:>10.2f} {result['current_bytes_per_connection']:>12.0f}")
+        print(f"saved {result['saved_percent']:.1f}%")
@@ -0,0 +1,408 @@
+# benchmarks/load_test.py
+"""
+Load-test the whole pipeline: N rooms x M guests over real WebSockets.
+
+The FastAPI app runs in this process under uvicorn with the fake
+transcription and translation backends. Simulated hosts and guests run in
+a child process, so client work doesn't show up in the server's memory,
+event-loop lag or CPU. Each host streams synthetic PCM at real time (or
+--speed times faster) and each guest reads its room's partials, finals
+and translations.
+
+Reported:
+- throughput: audio seconds, finals, translations and frames per second
+- per-stage p50/p99 from the server's stage histograms (estimated within buckets)
+- glass-to-glass p50/p99 measured by guests from the "timing" on finals and translations
+- server memory per connection (RSS growth while clients connect)
+- server event-loop lag while audio streams
+
+Results are JSON with the run's settings and git revision, so two runs can
+be compared with --output.
+
+Usage:
+    python -m benchmarks.load_test [--rooms 4] [--guests 20] [--duration 20] [--protocol json|msgpack] [--output results.json]
+"""
+from array import array
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+SAMPLE_RATE = 16_000
+LANGUAGES = ["es", "fr", "de", "it"]
+# Guests per room the join endpoint allows
+MAX_GUESTS = 50
+
+def percentiles(samples: list) -> dict:
+    """Nearest-rank p50/p90/p99 and max of samples, in the samples' unit."""
+    if not samples:
+        return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+    def rank(q: float):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+    return {"count": len(ordered), "p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "max": ordered[-1]}
+
+def histogram_quantile(q: float, buckets: list, count: int):
+    """Estimate a quantile from cumulative (upper bound, count) buckets, interpolating as Prometheus does."""
+    if not count:
+        return None
+    target = q * count
+    lower, below = 0.0, 0
+    for bound, cumulative in buckets:
+        if cumulative >= target:
+            if bound == float("inf"):
+                return lower  # Beyond the last finite bucket; its bound is the best answer
+            in_bucket = cumulative - below
+            return lower + (bound - lower) * ((target - below) / in_bucket if in_bucket else 0)
+        lower, below = bound, cumulative
+    return lower
+
+def tone_chunk(chunk_ms: int) -> bytes:
+    """One chunk of a 440 Hz tone as 16-bit mono PCM, loud enough to pass voice detection."""
+    samples = SAMPLE_RATE * chunk_ms // 1000
+    return array("h", (int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE)) for i in range(samples))).tobytes()
+
+def post(url: str) -> dict:
+    request = urllib.request.Request(url, method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+def create_rooms(http_url: str, rooms: int, guests: int) -> list:
+    """Create the rooms and join every guest over the HTTP API; returns [(host id, [guest ids])]."""
+    layout = []
+    for room_index in range(rooms):
+        host_id = f"loadhost{room_index}"
+        code = post(f"{http_url}/api/rooms/create/{host_id}")["room_code"]
+        guest_ids = [f"loadguest{room_index}_{index}" for index in range(guests)]
+        for guest_id in guest_ids:
+            post(f"{http_url}/api/rooms/join/{code}/{guest_id}")
+        layout.append((host_id, guest_ids))
+    return layout
+
+class ClientStats:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.by_type = {}
+        self.final_ms = []  # Server received the audio to a guest decoding the final
+        self.translation_ms = []  # Same for translations
+        self.delivery_ms = []  # Server sent (final or translated) to a guest decoding it
+        self.audio_chunks = 0
+        self.disconnects = 0
+
+async def run_guest(ws_url: str, user_id: str, language: str, protocol: str, stats: ClientStats, stop: asyncio.Event, ready):
+    from websockets.asyncio.client import connect
+    from websockets.exceptions import ConnectionClosed
+    from tools.wire_protocol import decode_msgpack
+
+    subprotocols = ["echo.msgpack.v1"] if protocol == "msgpack" else None
+    async with connect(f"{ws_url}/ws/{user_id}", subprotocols=subprotocols, max_size=None) as websocket:
+        preference = {"type": "language_preference", "language": language}
+        if protocol == "msgpack":
+            from tools.wire_protocol import encode_msgpack
+            await websocket.send(encode_msgpack(preference))
+        else:
+            await websocket.send(json.dumps(preference))
+        ready()
+        try:
+            while not stop.is_set():
+                try:
+                    frame = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now_ms = time.time() * 1000
+                stats.frames += 1
+                stats.bytes += len(frame)
+                message = decode_msgpack(frame) if isinstance(frame, bytes) else json.loads(frame)
+                message_type = message.get("type")
+                stats.by_type[message_type] = stats.by_type.get(message_type, 0) + 1
+                timing = message.get("timing")
+                if not timing or "audio" not in timing:
+                    continue
+                if message_type == "final":
+                    stats.final_ms.append(now_ms - timing["audio"])
+                    stats.delivery_ms.append(now_ms - timing["final"])
+                elif message_type == "translation":
+                    stats.translation_ms.append(now_ms - timing["audio"])
+                    stats.delivery_ms.append(now_ms - timing["translated"])
+        except ConnectionClosed:
+            stats.disconnects += 1
+
+async def run_host(ws_url: str, user_id: str, chunk: bytes, interval: float, stats: ClientStats, streaming: asyncio.Event, stop: asyncio.Event, ready):
+    from websockets.asyncio.client import connect
+
+    async with connect(f"{ws_url}/ws/{user_id}", max_size=None) as websocket:
+        async def drain():
+            # The host gets the room's broadcasts too; keep its queue from backing up
+            async for _ in websocket:
+                pass
+        reader = asyncio.create_task(drain())
+        ready()
+        await streaming.wait()
+        started = time.perf_counter()
+        sent = 0
+        while not stop.is_set():
+            await websocket.send(chunk)
+            sent += 1
+            stats.audio_chunks += 1
+            # Absolute schedule so pacing doesn't drift with send time
+            delay = started + sent * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        reader.cancel()
+
+async def drive_clients(http_url: str, ws_url: str, options: dict, pipe):
+    loop = asyncio.get_running_loop()
+    layout = await loop.run_in_executor(None, create_rooms, http_url, options["rooms"], options["guests"])
+    stats = ClientStats()
+    streaming, stop_hosts, stop_guests = asyncio.Event(), asyncio.Event(), asyncio.Event()
+    total = options["rooms"] * (options["guests"] + 1)
+    connected = 0
+    all_connected = asyncio.Event()
+
+    def ready():
+        nonlocal connected
+        connected += 1
+        if connected == total:
+            all_connected.set()
+
+    chunk = tone_chunk(options["chunk_ms"])
+    interval = options["chunk_ms"] / 1000 / options["speed"]
+    tasks = []
+    for room_index, (host_id, guest_ids) in enumerate(layout):
+        for index, guest_id in enumerate(guest_ids):
+            language = LANGUAGES[(room_index + index) % options["languages"]]
+            tasks.append(asyncio.create_task(run_guest(ws_url, guest_id, language, options["protocol"], stats, stop_guests, ready)))
+        tasks.append(asyncio.create_task(run_host(ws_url, host_id, chunk, interval, stats, streaming, stop_hosts, ready)))
+
+    await asyncio.wait_for(all_connected.wait(), timeout=60)
+    # Let language preferences land before audio starts
+    await asyncio.sleep(0.5)
+    pipe.send("connected")
+    await loop.run_in_executor(None, pipe.recv)
+
+    stats_before = (stats.frames, stats.bytes)
+    started = time.perf_counter()
+    streaming.set()
+    await asyncio.sleep(options["duration"])
+    stop_hosts.set()
+    streamed = time.perf_counter() - started
+    # Finals for the tail of the audio and their translations are still on their way
+    await asyncio.sleep(options["drain"])
+    stop_guests.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [repr(result) for result in results if isinstance(result, Exception)]
+
+    pipe.send({
+        "streamed_seconds": streamed,
+        "audio_seconds": stats.audio_chunks * options["chunk_ms"] / 1000,
+        "frames": stats.frames - stats_before[0],
+        "bytes": stats.bytes - stats_before[1],
+        "messages_by_type": stats.by_type,
+        "glass_to_glass_ms": {
+            "final": percentiles(stats.final_ms),
+            "translation": percentiles(stats.translation_ms),
+            "delivery": percentiles(stats.delivery_ms)
+        },
+        "disconnects": stats.disconnects,
+        "errors": errors[:10]
+    })
+
+def client_process(http_url: str, ws_url: str, options: dict, pipe):
+    asyncio.run(drive_clients(http_url, ws_url, options, pipe))
+
+def rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+async def sample_loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.05):
+    """Record how late the event loop wakes from a fixed sleep, in milliseconds."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+async def run(options: dict) -> dict:
+    # The app reads its backends from the environment when it is imported
+    os.environ["TRANSCRIPTION_BACKEND"] = "fake"
+    os.environ["TRANSLATION_PROVIDER"] = "fake"
+    os.environ["FAKE_TRANSLATION_LATENCY_MS"] = str(options["translation_latency_ms"])
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import uvicorn
+    import main as app_module
+    from tools.metrics import STAGES
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    loop = asyncio.get_running_loop()
+    parent_pipe, child_pipe = multiprocessing.Pipe()
+    clients = multiprocessing.get_context("spawn").Process(
+        target=client_process,
+        args=(f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}", options, child_pipe),
+        daemon=True
+    )
+    rss_idle = rss_bytes()
+    clients.start()
+    await loop.run_in_executor(None, parent_pipe.recv)
+    connections = len(app_module.connection_manager.active_connections)
+    rss_connected = rss_bytes()
+    stages_before = STAGES.snapshot()
+
+    lag_samples, stop_lag = [], asyncio.Event()
+    lag_task = asyncio.create_task(sample_loop_lag(lag_samples, stop_lag))
+    cpu_before = time.process_time()
+    parent_pipe.send("go")
+    client_results = await loop.run_in_executor(None, parent_pipe.recv)
+    cpu = time.process_time() - cpu_before
+    stop_lag.set()
+    await lag_task
+
+    stages = {}
+    for stage, series in STAGES.snapshot().items():
+        # Only what this run added, in case the histograms already held samples
+        earlier = stages_before.get(stage)
+        count = series["count"] - (earlier["count"] if earlier else 0)
+        buckets = [
+            (bound, cumulative - (earlier["buckets"][index][1] if earlier else 0))
+            for index, (bound, cumulative) in enumerate(series["buckets"])
+        ]
+        stages[stage] = {
+            "count": count,
+            "p50_ms": _ms(histogram_quantile(0.5, buckets, count)),
+            "p99_ms": _ms(histogram_quantile(0.99, buckets, count)),
+            "mean_ms": _ms((series["sum"] - (earlier["sum"] if earlier else 0)) / count) if count else None
+        }
+    server_stats = await app_module.get_stats()
+
+    clients.join(timeout=10)
+    server.should_exit = True
+    await serving
+
+    seconds = client_results["streamed_seconds"]
+    by_type = client_results["messages_by_type"]
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": options,
+        "connections": connections,
+        "throughput": {
+            "audio_seconds_per_second": client_results["audio_seconds"] / seconds,
+            # Every guest of a room receives each of its finals
+            "finals_per_second": by_type.get("final", 0) / options["guests"] / seconds,
+            "translations_delivered_per_second": by_type.get("translation", 0) / seconds,
+            "frames_per_second": client_results["frames"] / seconds,
+            "bytes_per_second": client_results["bytes"] / seconds
+        },
+        "stages": stages,
+        "glass_to_glass_ms": client_results["glass_to_glass_ms"],
+        "memory": {
+            "rss_idle_bytes": rss_idle,
+            "rss_connected_bytes": rss_connected,
+            "bytes_per_connection": (rss_connected - rss_idle) / connections if connections else None
+        },
+        "event_loop_lag_ms": percentiles(lag_samples),
+        "server_cpu_seconds_per_second": cpu / seconds,
+        "messages_by_type": by_type,
+        "dropped": {
+            "audio_chunks": sum(room["dropped_chunks"] for room in server_stats["transcribers"].values()),
+            "slow_consumer_disconnects": server_stats["connections"]["slow_consumer_disconnects"],
+            "client_disconnects": client_results["disconnects"]
+        },
+        "errors": client_results["errors"]
+    }
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+def print_report(result: dict):
+    throughput = result["throughput"]
+    print(f"{result['config']['rooms']} rooms x {result['config']['guests']} guests, "
+          f"{result['connections']} connections, revision {result['revision']}")
+    print(f"audio {throughput['audio_seconds_per_second']:.2f} s/s, finals {throughput['finals_per_second']:.1f}/s, "
+          f"translations delivered {throughput['translations_delivered_per_second']:.1f}/s, frames {throughput['frames_per_second']:.0f}/s")
+    print(f"\n{'stage':>22} {'count':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for stage, row in sorted(result["stages"].items()):
+        if row["count"]:
+            print(f"{stage:>22} {row['count']:>8} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    print(f"\n{'glass to glass':>22} {'count':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for kind, row in result["glass_to_glass_ms"].items():
+        if row["count"]:
+            print(f"{kind:>22} {row['count']:>8} {row['p50']:>9.1f} {row['p99']:>9.1f}")
+    lag = result["event_loop_lag_ms"]
+    memory = result["memory"]
+    print(f"\nevent loop lag p50 {lag['p50']:.2f} ms, p99 {lag['p99']:.2f} ms, max {lag['max']:.2f} ms")
+    if memory["bytes_per_connection"] is not None:
+        print(f"memory {memory['bytes_per_connection'] / 1024:.1f} KiB RSS per connection")
+    print(f"server CPU {result['server_cpu_seconds_per_second']:.2f} s/s, dropped {result['dropped']}")
+    for error in result["errors"]:
+        print(f"error: {error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--guests", type=int, default=20, help=f"Guests per room (at most {MAX_GUESTS})")
+    parser.add_argument("--languages", type=int, default=2, help=f"Distinct guest languages per room (1-{len(LANGUAGES)})")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of audio streaming")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to keep reading after audio stops")
+    parser.add_argument("--speed", type=float, default=1.0, help="Audio sent at this multiple of real time")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Milliseconds of audio per host message")
+    parser.add_argument("--protocol", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--translation-latency-ms", type=float, default=50.0, help="Fake translation provider delay")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+    if not 1 <= args.guests <= MAX_GUESTS:
+        parser.error(f"--guests must be between 1 and {MAX_GUESTS}")
+    if not 1 <= args.languages <= len(LANGUAGES):
+        parser.error(f"--languages must be between 1 and {len(LANGUAGES)}")
+
+    options = {
+        "rooms": args.rooms,
+        "guests": args.guests,
+        "languages": args.languages,
+        "duration": args.duration,
+        "drain": args.drain,
+        "speed": args.speed,
+        "chunk_ms": args.chunk_ms,
+        "protocol": args.protocol,
+        "translation_latency_ms": args.translation_latency_ms
+    }
+    result = asyncio.run(run(options))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
@@ -0,0 +1,105 @@
+# benchmarks/wire_protocol.py
+"""
+Measure bytes on the wire, encode time and deflate time per message for each guest protocol.
+
+Replays a typical stream a guest receives: growing partials, then the
+final and its translation, per utterance. Sizes are reported raw and as
+permessage-deflate would send them (raw DEFLATE, context kept between
+messages, each message flushed and its 4-byte tail stripped).
+
+Encode time is paid once per broadcast per protocol. Deflate time is paid
+per recipient, since every connection keeps its own compression context.
+
+Usage:
+    python -m benchmarks.wire_protocol [--utterances 200]
+"""
+from datetime import datetime
+import argparse
+import json
+import time
+import zlib
+
+from tools.transcription_backends import DEFAULT_FAKE_SCRIPT
+from tools.wire_protocol import encode_message, encode_msgpack
+
+def guest_stream(utterances: int) -> list:
+    messages = []
+    for segment_id in range(1, utterances + 1):
+        words = DEFAULT_FAKE_SCRIPT[segment_id % len(DEFAULT_FAKE_SCRIPT)].split()
+        for count in range(1, len(words) + 1):
+            messages.append({
+                "type": "partial",
+                "text": " ".join(words[:count]),
+                "timestamp": datetime.now().isoformat(),
+                "is_final": False,
+                "seq": len(messages)
+            })
+        text = " ".join(words)
+        messages.append({
+            "type": "final",
+            "text": text,
+            "timestamp": datetime.now().isoformat(),
+            "confidence": 0.94,
+            "segment_id": segment_id
+        })
+        messages.append({
+            "type": "translation",
+            "text": f"[es] {text}",
+            "original_text": text,
+            "language": "es",
+            "segment_id": segment_id,
+            "timestamp": datetime.now().isoformat()
+        })
+    return messages
+
+def deflate(frames: list) -> tuple:
+    """Bytes permessage-deflate would put on the wire with context takeover, and the seconds it took."""
+    payloads = [frame.encode() if isinstance(frame, str) else frame for frame in frames]
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    start = time.perf_counter()
+    for data in payloads:
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total, time.perf_counter() - start
+
+def measure(encode, messages: list) -> dict:
+    start = time.perf_counter()
+    frames = [encode(message) for message in messages]
+    elapsed = time.perf_counter() - start
+    raw = sum(len(frame.encode() if isinstance(frame, str) else frame) for frame in frames)
+    deflated, deflate_time = deflate(frames)
+    return {
+        "bytes_per_message": raw / len(messages),
+        "deflated_bytes_per_message": deflated / len(messages),
+        "encode_us_per_message": elapsed / len(messages) * 1e6,
+        "deflate_us_per_message": deflate_time / len(messages) * 1e6
+    }
+
+def main(utterances: int) -> dict:
+    messages = guest_stream(utterances)
+    return {
+        "messages": len(messages),
+        "json": measure(encode_message, messages),
+        "msgpack": measure(encode_msgpack, messages)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    result = main(args.utterances)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'protocol':>9} {'bytes/msg':>10} {'deflated':>10} {'encode us':>10} {'deflate us':>11}")
+        for protocol in ("json", "msgpack"):
+            row = result[protocol]
+            print(
+                f"{protocol:>9} "
+                f"{row['bytes_per_message']:>10.1f} "
+                f"{row['deflated_bytes_per_message']:>10.1f} "
+                f"{row['encode_us_per_message']:>10.2f} "
+                f"{row['deflate_us_per_message']:>11.2f}"
+            )
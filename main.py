@@ -1,7 +1,7 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 import json
 import asyncio
 from typing import Dict, Optional
@@ -11,13 +11,26 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 
-from tools.real_time_transcript import RealTimeTranscriber
-from tools.text_translation import translate
+from tools.real_time_transcript import RealTimeTranscriber, shutdown_audio_executor
+from tools.text_translation import translate, get_translation_service, close_translation_service
 from tools.room_manager import RoomManager
+from tools.connection_manager import ConnectionManager
+from tools.translation_batcher import get_translation_batcher
+from tools.cluster import ClusterNode, create_cluster_backend
+from tools.logging_config import configure_logging, get_logger, shutdown_logging
+from tools.wire_protocol import receive_message
+from tools.transcript_history import get_transcript_history, close_transcript_history, history_key
+from tools.metrics import get_metrics
 
 # Load environment variables
 load_dotenv()
 
+# Log records are written by a background thread (LOG_LEVEL, LOG_FORMAT=text|json)
+configure_logging()
+log = get_logger("server")
+# Per-message events, sampled when debug logging is on
+message_log = get_logger("server.messages", sampled=True)
+
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -25,82 +38,108 @@ templates = Jinja2Templates(directory="templates")
 # Initialize room manager
 room_manager = RoomManager()
 
-# Store active connections and transcribers
-connections: Dict[str, WebSocket] = {}
+# Active transcribers by host (per-connection state lives in ConnectionManager)
 transcribers: Dict[str, RealTimeTranscriber] = {}
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        
-    async def connect(self, user_id: str, websocket: WebSocket):
-        """Connect a new user."""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"User {user_id} connected. Total connections: {len(self.active_connections)}")
-        
-    def disconnect(self, user_id: str):
-        """Disconnect a user."""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"User {user_id} disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def send_to_user(self, user_id: str, message: dict):
-        """Send a message to a specific user."""
-        print(f"Attempting to send message to user {user_id}")
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-                print(f"Successfully sent message to user {user_id}")
-            except Exception as e:
-                print(f"Error sending message to user {user_id}: {e}")
-                raise
-        else:
-            print(f"User {user_id} not found in active connections")
-                
-    async def broadcast_to_room(self, room_code: str, message: dict, exclude_user: str = None):
-        """Broadcast message to all users in a room."""
-        room = room_manager.get_room(room_code)
-        if not room:
-            print(f"Room {room_code} not found")
-            return
-            
-        users = {room.host_id} | room.guests
-        print(f"Broadcasting to room {room_code} with {len(users)} users")
-        
-        for user_id in users:
-            if user_id != exclude_user and user_id in self.active_connections:
-                try:
-                    await self.active_connections[user_id].send_json(message)
-                    print(f"Broadcast message sent to user {user_id}")
-                except Exception as e:
-                    print(f"Error broadcasting to user {user_id}: {e}")
-                    
-    async def update_participant_count(self, room_code: str):
-        """Broadcast updated participant count to all users in a room."""
-        room = room_manager.get_room(room_code)
-        if room:
-            await self.broadcast_to_room(
-                room_code,
-                {
-                    "type": "participant_count",
-                    "count": len(room.guests) + 1,  # +1 for the host
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
-
 # Initialize connection manager
-connection_manager = ConnectionManager()
+connection_manager = ConnectionManager(room_manager)
+# Inactivity sweeps read liveness straight from the connection records
+room_manager.activity_source = connection_manager.last_active
+
+# Shares rooms and fan-out with other processes (single process by default)
+cluster = ClusterNode(create_cluster_backend(), room_manager, connection_manager)
+
+# Gauges are read when /metrics is scraped; the stage histograms fill in as messages flow
+metrics = get_metrics()
+def connections_by_role() -> Dict[str, int]:
+    counts = {"host": 0, "guest": 0}
+    for connection in connection_manager.active_connections.values():
+        role = connection.role or "unbound"
+        counts[role] = counts.get(role, 0) + 1
+    return counts
+
+metrics.gauge("echo_rooms", "Rooms known to this node", lambda: room_manager.stats()["rooms"])
+metrics.gauge("echo_connections", "Open WebSocket connections on this node by role", connections_by_role, label="role")
+metrics.gauge(
+    "echo_audio_queue_depth",
+    "Audio chunks waiting to be streamed, summed over rooms",
+    lambda: sum(transcriber.audio_queue.qsize() for transcriber in transcribers.values())
+)
+metrics.gauge(
+    "echo_translations_in_flight",
+    "Translation jobs by state, summed over rooms",
+    lambda: {
+        state: sum(transcriber.scheduler.stats()[state] for transcriber in transcribers.values())
+        for state in ("running", "waiting")
+    },
+    label="state"
+)
+# Latency guests measure against the server timestamps carried in "timing"
+client_latency = metrics.histogram(
+    "echo_client_latency_seconds",
+    "Audio arriving at the server to text shown on a guest's screen, as reported by guests",
+    label="kind",
+    buckets=(0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+)
+
+async def handle_cluster_control(room_code: str, message: dict):
+    """Apply a guest's control message sent from another node to the local transcriber."""
+    room = room_manager.get_room(room_code)
+    transcriber = transcribers.get(room.host_id) if room else None
+    if not transcriber:
+        if room and message.get("type") == "language_preference":
+            # In case the host's transcriber starts on this node later
+            room_manager.set_language(room_code, message["user_id"], message["language"])
+        elif room and message.get("type") == "remove_user":
+            room_manager.set_language(room_code, message["user_id"], None)
+        return
+    if message.get("type") == "language_preference":
+        # The guest's node confirmed the preference when it stored it
+        await transcriber.set_user_language(message["user_id"], message["language"], confirm=False)
+    elif message.get("type") == "remove_user":
+        transcriber.remove_user(message["user_id"])
+
+def stop_transcriber(host_id: str, transcriber: RealTimeTranscriber):
+    """Stop a host's transcriber, forgetting it unless a reconnect already replaced it."""
+    transcriber.stop()
+    if transcribers.get(host_id) is transcriber:
+        del transcribers[host_id]
 
 @app.on_event("startup")
 async def startup_event():
+    # Create the translation client once so every request reuses its connection pool
+    try:
+        get_translation_service()
+    except ValueError as e:
+        log.warning("Translation service unavailable: %s", e)
+
+    cluster.on_control = handle_cluster_control
+    await cluster.start()
+    
+    def history_in_use(key: str) -> bool:
+        room = room_manager.get_room(key.partition("@")[0])
+        return room is not None and history_key(room) == key
+
     async def periodic_cleanup():
         while True:
             await asyncio.sleep(300)  # Run every 5 minutes
-            room_manager.cleanup_inactive_users()
+            sweep = room_manager.sweep()
+            # Transcript history goes with its room
+            sweep["histories_removed"] = get_transcript_history().prune(history_in_use)
+            if sweep["users_removed"] or sweep["rooms_evicted"] or sweep["histories_removed"]:
+                log.info("Cleanup sweep reclaimed %s", sweep, extra=sweep)
     
     asyncio.create_task(periodic_cleanup())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await cluster.close()
+    connection_manager.close()
+    await close_translation_service()
+    close_transcript_history()
+    shutdown_audio_executor()
+    shutdown_logging()
+
 @app.middleware("http")
 async def add_cross_origin_isolate_headers(request, call_next):
     """Add necessary headers for AudioWorklet functionality."""
@@ -121,6 +160,8 @@ async def get(request: Request):
 async def create_room(user_id: str):
     """Create a new room."""
     try:
+        # Make sure a membership held through another node is known here
+        await cluster.ensure_user_room(user_id)
         room = room_manager.create_room(host_id=user_id)
         return {
             "status": "success",
@@ -134,6 +175,9 @@ async def create_room(user_id: str):
 async def join_room(room_code: str, user_id: str):
     """Join an existing room."""
     try:
+        await cluster.ensure_user_room(user_id)
+        await cluster.ensure_room(room_code)
+
         # First, remove user from any existing room
         room_manager.leave_room(user_id)
         
@@ -152,6 +196,24 @@ async def join_room(room_code: str, user_id: str):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/api/rooms/{room_code}/history/{user_id}")
+async def get_room_history(room_code: str, user_id: str, after: int = 0, language: Optional[str] = None, limit: int = 100):
+    """
+    Replay finals and their stored translations after a cursor.
+
+    after is the last segment_id the client already has (0 for everything
+    retained). language defaults to the member's chosen language.
+    """
+    room = await cluster.ensure_user_room(user_id)
+    if not room or room.code != room_code:
+        raise HTTPException(status_code=403, detail="Not a member of this room")
+    return get_transcript_history().replay(
+        history_key(room),
+        after=after,
+        language=language or room.member_languages.get(user_id),
+        limit=min(max(limit, 1), 500)
+    )
+
 def leave_room(self, user_id: str) -> None:
     """Remove a user from their current room."""
     room_code = self._user_to_room.get(user_id)
@@ -182,26 +244,34 @@ def leave_room(self, user_id: str) -> None:
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await connection_manager.connect(client_id, websocket)
-    print(f"WebSocket connected for client {client_id}")
+    connection = await connection_manager.connect(client_id, websocket)
+    log.info("WebSocket connected for client %s", client_id, extra={"user_id": client_id})
+    room = None
+    transcriber = None
     
     try:
-        room = room_manager.get_user_room(client_id)
+        # The room may have been joined through another node
+        room = await cluster.ensure_user_room(client_id)
         if not room:
-            print(f"No room found for client {client_id}")
+            log.info("No room found for client %s", client_id, extra={"user_id": client_id})
+            connection_manager.disconnect(connection)
             await websocket.close(code=4000, reason="Not in a room")
             return
-        
-        # Update last active timestamp
-        room.user_last_active[client_id] = datetime.now()
+        await cluster.watch_room(room.code)
+        is_host = room_manager.is_room_host(room.code, client_id)
+        connection_manager.bind(connection, room, "host" if is_host else "guest")
             
-        if room_manager.is_room_host(room.code, client_id):
-            print(f"Client {client_id} is host of room {room.code}")
+        if is_host:
+            log.info("Client %s is host of room %s", client_id, room.code, extra={"user_id": client_id, "room": room.code})
             transcriber = RealTimeTranscriber(
                 websocket=websocket,
                 room_code=room.code,
                 connection_manager=connection_manager
             )
+            previous = transcribers.get(client_id)
+            if previous:
+                # The host reconnected; the old socket's session is replaced
+                previous.stop()
             transcribers[client_id] = transcriber
             await transcriber.connect()
             
@@ -215,44 +285,74 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             )
         
         while True:
-            # Periodically update last active timestamp
-            room.user_last_active[client_id] = datetime.now()
+            # Record activity (a field store; the clock is sampled once a second)
+            connection.touch()
             
             # Timeout for receiving messages to allow timestamp updates
             try:
-                if room_manager.is_room_host(room.code, client_id):
+                if is_host:
                     data = await asyncio.wait_for(websocket.receive_bytes(), timeout=30.0)
-                    transcribers[client_id].process_audio(data)
+                    await transcriber.process_audio(data)
                 else:
-                    data = await asyncio.wait_for(websocket.receive_json(), timeout=30.0)
-                    print(f"Received message from client {client_id}: {data}")
+                    # JSON text, or MessagePack for guests that negotiated it
+                    data = await asyncio.wait_for(receive_message(websocket), timeout=30.0)
+                    message_log.debug("Received message from client %s: %s", client_id, data)
                     
                     if data.get("type") == "ping":
-                        await websocket.send_json({"type": "pong"})
+                        await connection_manager.send_to_user(client_id, {"type": "pong"})
                     elif data.get("type") == "language_preference":
                         language = data.get("language")
-                        print(f"Setting language preference for {client_id}: {language}")
+                        log.debug("Setting language preference for %s: %s", client_id, language)
                         host_id = room.host_id
                         if host_id in transcribers:
                             await transcribers[host_id].set_user_language(client_id, language)
                         else:
-                            print(f"Host transcriber not found for room {room.code}")
+                            # Kept by the (shared) room, so the host's transcriber uses it wherever it starts
+                            room_manager.set_language(room.code, client_id, language)
+                            connection.language = language
+                            # Lets a transcriber running on another node cancel work for the old language
+                            if await cluster.send_control(room.code, {
+                                "type": "language_preference",
+                                "user_id": client_id,
+                                "language": language
+                            }):
+                                log.debug("Forwarded language preference for %s to the host's node", client_id)
+                            await connection_manager.send_to_user(client_id, {
+                                "type": "language_confirmed",
+                                "language": language,
+                                "timestamp": datetime.now().isoformat()
+                            })
+                    elif data.get("type") == "latency_report":
+                        kind = data.get("kind")
+                        latency_ms = data.get("latency_ms")
+                        # Fixed label set and a sanity bound, since clients choose these values
+                        if kind in ("final", "translation") and isinstance(latency_ms, (int, float)) and 0 <= latency_ms < 600_000:
+                            client_latency.observe(latency_ms / 1000, kind)
             
             except asyncio.TimeoutError:
                 # Send a ping to keep the connection alive
-                await websocket.send_json({"type": "ping"})
+                await connection_manager.send_to_user(client_id, {"type": "ping"})
                 continue
         
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected for client {client_id}")
-        connection_manager.disconnect(client_id)
+        log.info("WebSocket disconnected for client %s", client_id, extra={"user_id": client_id})
+        # False when a reconnect already replaced this socket and now owns the user's state
+        current = connection_manager.disconnect(connection)
         
         # Do not immediately remove from room, let cleanup handle it
-        if client_id in transcribers:
-            transcribers[client_id].stop()
-            del transcribers[client_id]
+        if transcriber:
+            stop_transcriber(client_id, transcriber)
+        elif current and room and room.host_id in transcribers:
+            # Cancel translations queued only for this guest
+            transcribers[room.host_id].remove_user(client_id)
+        elif current and room:
+            # No translations are needed for a guest who isn't connected
+            room_manager.set_language(room.code, client_id, None)
+            await cluster.send_control(room.code, {"type": "remove_user", "user_id": client_id})
         
         if room:
+            await cluster.unwatch_room(room.code)
+        if room and current:
             await connection_manager.broadcast_to_room(
                 room.code,
                 {
@@ -263,12 +363,38 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             )
     
     except Exception as e:
-        print(f"Error in websocket connection for {client_id}: {str(e)}")
-        connection_manager.disconnect(client_id)
+        log.exception("Error in websocket connection for %s: %s", client_id, e, extra={"user_id": client_id})
+        connection_manager.disconnect(connection)
+        if room:
+            await cluster.unwatch_room(room.code)
         
-        if client_id in transcribers:
-            transcribers[client_id].stop()
-            del transcribers[client_id]
+        if transcriber:
+            stop_transcriber(client_id, transcriber)
+
+@app.get("/api/stats")
+async def get_stats():
+    """Report runtime counters used for capacity planning."""
+    stats = {}
+    try:
+        service = get_translation_service()
+        stats["translation_cache"] = service.cache.stats()
+        stats["translation_rate_limit"] = service.rate_limiter.stats()
+    except ValueError:
+        stats["translation_cache"] = None
+    stats["translation_batcher"] = get_translation_batcher().stats()
+    stats["rooms"] = room_manager.stats()
+    stats["connections"] = connection_manager.stats()
+    stats["cluster"] = cluster.stats()
+    stats["transcript_history"] = get_transcript_history().stats()
+    stats["transcribers"] = {
+        transcriber.room_code: transcriber.stats() for transcriber in transcribers.values()
+    }
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics_text():
+    """Expose latency histograms and load gauges in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/host.html", response_class=HTMLResponse)
 async def get_host_view(request: Request):
@@ -280,4 +406,10 @@ async def get_participant_view(request: Request):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Browsers negotiate permessage-deflate on their own; WS_PER_MESSAGE_DEFLATE=false turns it off
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
+    )
\ No newline at end of file
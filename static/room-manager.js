@@ -169,7 +169,7 @@ class RoomManager {
                 language: languageCode
             };
             console.log('Sending message:', message);
-            this.socket.send(JSON.stringify(message));
+            EchoWire.send(this.socket, message);
         } else {
             console.error('Socket not ready:', {
                 exists: !!this.socket,
@@ -195,7 +195,8 @@ class RoomManager {
 
     connectWebSocket() {
         console.log('Connecting WebSocket...');
-        this.socket = new WebSocket(`ws://${window.location.host}/ws/${this.userId}`);
+        // MessagePack frames when the server supports them (needs wire-protocol.js), JSON otherwise
+        this.socket = EchoWire.connect(`ws://${window.location.host}/ws/${this.userId}`);
         
         this.socket.onopen = () => {
             console.log('WebSocket connected');
@@ -219,7 +220,7 @@ class RoomManager {
         };
         
         this.socket.onmessage = (event) => {
-            const data = JSON.parse(event.data);
+            const data = EchoWire.decode(event.data);
             console.log('Received WebSocket message:', data);
             this.handleWebSocketMessage(data);
         };
@@ -228,7 +229,7 @@ class RoomManager {
     startPingPong() {
         this.pingInterval = setInterval(() => {
             if (this.socket && this.socket.readyState === WebSocket.OPEN) {
-                this.socket.send(JSON.stringify({ type: 'ping' }));
+                EchoWire.send(this.socket, { type: 'ping' });
             }
         }, 30000);
     }
@@ -256,6 +257,7 @@ class RoomManager {
                 console.error('Received error message:', data.text);
                 this.showError(data.text);
                 break;
+            case 'translation_partial':
             case 'translation':
                 console.log('Translation received:', data);
                 if (window.handleTranscriptMessage) {
@@ -62,6 +62,25 @@ function addTranslation(transcriptId, translationText) {
     }
 }
 
+// Partial being built for the current segment; diff updates apply on top of it
+let partialText = null;
+let partialSeq = 0;
+
+function applyPartial(data) {
+    if (data.offset === undefined) {
+        // Whole text
+        partialText = data.text;
+    } else if (partialText !== null && data.seq === partialSeq + 1) {
+        // Changed suffix of the previous partial
+        partialText = partialText.slice(0, data.offset) + data.text;
+    } else {
+        // Missed an update; wait for the next full partial
+        return null;
+    }
+    partialSeq = data.seq;
+    return partialText;
+}
+
 function updatePartialTranscript(text) {
     console.log('Updating partial transcript:', text); // Debug log
     
@@ -83,6 +102,7 @@ function finalizeTranscript(text) {
     if (partialEntry) {
         partialEntry.remove();
     }
+    partialText = null;
 
     const finalEntry = createTranscriptEntry(text, false);
     window.currentTranscriptId = finalEntry.id;
@@ -97,12 +117,16 @@ window.handleTranscriptMessage = function(data) {
     switch(data.type) {
         case 'partial':
             console.log('Processing partial transcript');
-            updatePartialTranscript(data.text);
+            const text = applyPartial(data);
+            if (text !== null) {
+                updatePartialTranscript(text);
+            }
             break;
         case 'final':
             console.log('Processing final transcript');
             finalizeTranscript(data.text);
             break;
+        case 'translation_partial':
         case 'translation':
             console.log('Processing translation');
             if (window.currentTranscriptId) {
@@ -0,0 +1,191 @@
+// static/wire-protocol.js
+// Guest WebSocket protocol: compact MessagePack frames when the server supports
+// them, JSON text otherwise. Keep the tables in step with tools/wire_protocol.py.
+
+const EchoWire = (() => {
+    const MSGPACK = 'echo.msgpack.v1';
+    const JSON_PROTOCOL = 'echo.json.v1';
+
+    const MESSAGE_TYPES = [
+        'ping', 'pong', 'status', 'error', 'partial', 'final', 'translation',
+        'translation_partial', 'host_status', 'user_left', 'participant_count',
+        'language_confirmed', 'language_preference', 'latency_report'
+    ];
+    const FIELDS = [
+        'type', 'text', 'timestamp', 'segment_id', 'confidence', 'is_final', 'seq',
+        'offset', 'language', 'original_text', 'status', 'user_id', 'count',
+        'timing', 'kind', 'latency_ms'
+    ];
+    const TYPE_TAGS = new Map(MESSAGE_TYPES.map((name, tag) => [name, tag]));
+    const FIELD_TAGS = new Map(FIELDS.map((name, tag) => [name, tag]));
+
+    const textDecoder = new TextDecoder();
+    const textEncoder = new TextEncoder();
+
+    // Minimal MessagePack decoder (no extension types)
+    function unpack(buffer) {
+        const bytes = new Uint8Array(buffer);
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let pos = 0;
+
+        function str(length) {
+            const value = textDecoder.decode(bytes.subarray(pos, pos + length));
+            pos += length;
+            return value;
+        }
+        function bin(length) {
+            const value = bytes.slice(pos, pos + length);
+            pos += length;
+            return value;
+        }
+        function array(length) {
+            const value = new Array(length);
+            for (let i = 0; i < length; i++) value[i] = read();
+            return value;
+        }
+        // Plain objects when every key is a string (nested maps such as "timing"),
+        // a Map otherwise (the tagged top level, whose keys are integers)
+        function map(length) {
+            const entries = new Array(length);
+            let stringKeys = true;
+            for (let i = 0; i < length; i++) {
+                const key = read();
+                stringKeys = stringKeys && typeof key === 'string';
+                entries[i] = [key, read()];
+            }
+            return stringKeys ? Object.fromEntries(entries) : new Map(entries);
+        }
+        function read() {
+            const byte = bytes[pos++];
+            if (byte < 0x80) return byte;
+            if (byte < 0x90) return map(byte & 0x0f);
+            if (byte < 0xa0) return array(byte & 0x0f);
+            if (byte < 0xc0) return str(byte & 0x1f);
+            if (byte >= 0xe0) return byte - 0x100;
+            let value;
+            switch (byte) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: value = bytes[pos]; pos += 1; return bin(value);
+                case 0xc5: value = view.getUint16(pos); pos += 2; return bin(value);
+                case 0xc6: value = view.getUint32(pos); pos += 4; return bin(value);
+                case 0xca: value = view.getFloat32(pos); pos += 4; return value;
+                case 0xcb: value = view.getFloat64(pos); pos += 8; return value;
+                case 0xcc: value = bytes[pos]; pos += 1; return value;
+                case 0xcd: value = view.getUint16(pos); pos += 2; return value;
+                case 0xce: value = view.getUint32(pos); pos += 4; return value;
+                case 0xcf: value = Number(view.getBigUint64(pos)); pos += 8; return value;
+                case 0xd0: value = view.getInt8(pos); pos += 1; return value;
+                case 0xd1: value = view.getInt16(pos); pos += 2; return value;
+                case 0xd2: value = view.getInt32(pos); pos += 4; return value;
+                case 0xd3: value = Number(view.getBigInt64(pos)); pos += 8; return value;
+                case 0xd9: value = bytes[pos]; pos += 1; return str(value);
+                case 0xda: value = view.getUint16(pos); pos += 2; return str(value);
+                case 0xdb: value = view.getUint32(pos); pos += 4; return str(value);
+                case 0xdc: value = view.getUint16(pos); pos += 2; return array(value);
+                case 0xdd: value = view.getUint32(pos); pos += 4; return array(value);
+                case 0xde: value = view.getUint16(pos); pos += 2; return map(value);
+                case 0xdf: value = view.getUint32(pos); pos += 4; return map(value);
+                default: throw new Error(`Unsupported MessagePack byte 0x${byte.toString(16)}`);
+            }
+        }
+        return read();
+    }
+
+    // Minimal MessagePack encoder for the small control messages guests send
+    function pack(value) {
+        const out = [];
+        function bytes(...values) {
+            out.push(...values);
+        }
+        function uint(value, size) {
+            for (let shift = (size - 1) * 8; shift >= 0; shift -= 8) out.push((value >>> shift) & 0xff);
+        }
+        function write(value) {
+            if (value === null || value === undefined) return bytes(0xc0);
+            if (value === false) return bytes(0xc2);
+            if (value === true) return bytes(0xc3);
+            if (typeof value === 'number') {
+                if (Number.isInteger(value) && value >= 0 && value <= 0xffffffff) {
+                    if (value < 0x80) return bytes(value);
+                    if (value <= 0xff) return bytes(0xcc, value);
+                    if (value <= 0xffff) { bytes(0xcd); return uint(value, 2); }
+                    bytes(0xce); return uint(value, 4);
+                }
+                if (Number.isInteger(value) && value >= -0x80000000 && value < 0) {
+                    if (value >= -32) return bytes(value & 0xff);
+                    bytes(0xd2); return uint(value, 4);
+                }
+                const buffer = new DataView(new ArrayBuffer(8));
+                buffer.setFloat64(0, value);
+                return bytes(0xcb, ...new Uint8Array(buffer.buffer));
+            }
+            if (typeof value === 'string') {
+                const encoded = textEncoder.encode(value);
+                if (encoded.length < 32) bytes(0xa0 | encoded.length);
+                else if (encoded.length <= 0xff) bytes(0xd9, encoded.length);
+                else if (encoded.length <= 0xffff) { bytes(0xda); uint(encoded.length, 2); }
+                else { bytes(0xdb); uint(encoded.length, 4); }
+                for (const byte of encoded) out.push(byte);
+                return;
+            }
+            if (Array.isArray(value)) {
+                if (value.length < 16) bytes(0x90 | value.length);
+                else { bytes(0xdc); uint(value.length, 2); }
+                return value.forEach(write);
+            }
+            const entries = value instanceof Map ? [...value.entries()] : Object.entries(value);
+            if (entries.length < 16) bytes(0x80 | entries.length);
+            else { bytes(0xde); uint(entries.length, 2); }
+            for (const [key, item] of entries) {
+                write(key);
+                write(item);
+            }
+        }
+        write(value);
+        return new Uint8Array(out);
+    }
+
+    // Tagged map -> message object with the same keys the JSON protocol uses
+    function expand(compact) {
+        const message = {};
+        const entries = compact instanceof Map ? compact.entries() : Object.entries(compact);
+        for (const [key, value] of entries) {
+            const name = typeof key === 'number' && key < FIELDS.length ? FIELDS[key] : key;
+            message[name] = name === 'type' && typeof value === 'number' && value < MESSAGE_TYPES.length
+                ? MESSAGE_TYPES[value]
+                : value;
+        }
+        return message;
+    }
+
+    function compact(message) {
+        const tagged = new Map();
+        for (const [name, value] of Object.entries(message)) {
+            tagged.set(
+                FIELD_TAGS.has(name) ? FIELD_TAGS.get(name) : name,
+                name === 'type' && TYPE_TAGS.has(value) ? TYPE_TAGS.get(value) : value
+            );
+        }
+        return tagged;
+    }
+
+    return {
+        // Offer the binary protocol first; servers without it fall back to JSON
+        connect(url) {
+            const socket = new WebSocket(url, [MSGPACK, JSON_PROTOCOL]);
+            socket.binaryType = 'arraybuffer';
+            return socket;
+        },
+
+        // Message object from a MessageEvent's data (timestamps are epoch ms on the binary protocol)
+        decode(data) {
+            return typeof data === 'string' ? JSON.parse(data) : expand(unpack(data));
+        },
+
+        send(socket, message) {
+            socket.send(socket.protocol === MSGPACK ? pack(compact(message)) : JSON.stringify(message));
+        }
+    };
+})();
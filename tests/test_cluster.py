@@ -0,0 +1,71 @@
+import asyncio
+
+from tools.cluster import ClusterNode, LocalRedis, RedisClusterBackend
+from tools.connection_manager import ConnectionManager
+from tools.room_manager import RoomManager
+
+async def start_nodes(count: int, server: LocalRedis = None, first_index: int = 0):
+    server = server or LocalRedis()
+    nodes = []
+    for index in range(first_index, first_index + count):
+        room_manager = RoomManager()
+        node = ClusterNode(RedisClusterBackend(client=server), room_manager, ConnectionManager(room_manager), node_id=f"n{index}")
+        await node.start()
+        nodes.append(node)
+    return nodes
+
+def test_concurrent_joins_through_two_nodes_merge():
+    async def scenario():
+        first, second = await start_nodes(2)
+        room = first.room_manager.create_room("host")
+        await asyncio.sleep(0.1)
+        first.room_manager.join_room(room.code, "g0")
+        second.room_manager.join_room(room.code, "g1")
+        await asyncio.sleep(0.2)
+
+        stored = await first.backend.load_room(room.code)
+        assert first.room_manager.get_room(room.code).guests == {"g0", "g1"}
+        assert second.room_manager.get_room(room.code).guests == {"g0", "g1"}
+        assert set(stored["guests"]) == {"g0", "g1"}
+
+        second.room_manager.leave_room("g0")
+        first.room_manager.join_room(room.code, "g2")
+        await asyncio.sleep(0.2)
+        stored = await first.backend.load_room(room.code)
+        assert first.room_manager.get_room(room.code).guests == {"g1", "g2"}
+        assert second.room_manager.get_room(room.code).guests == {"g1", "g2"}
+        assert set(stored["guests"]) == {"g1", "g2"}
+        for node in (first, second):
+            await node.close()
+
+    asyncio.run(scenario())
+
+def test_language_preferences_reach_every_node():
+    async def scenario():
+        first, second = await start_nodes(2)
+        room = first.room_manager.create_room("host")
+        first.room_manager.join_room(room.code, "g0")
+        await asyncio.sleep(0.1)
+        second.room_manager.join_room(room.code, "g1")
+        await asyncio.sleep(0.1)
+        # Chosen concurrently on different nodes, before any transcriber exists
+        first.room_manager.set_language(room.code, "g0", "es")
+        second.room_manager.set_language(room.code, "g1", "fr")
+        await asyncio.sleep(0.2)
+
+        for node in (first, second):
+            assert node.room_manager.language_groups(room.code) == {"es": {"g0"}, "fr": {"g1"}}
+
+        # A node that never saw the room (the host reconnecting elsewhere) loads them from the backend
+        third, = await start_nodes(1, server=first.backend.client, first_index=2)
+        loaded = await third.ensure_room(room.code)
+        assert loaded.languages == {"es": {"g0"}, "fr": {"g1"}}
+
+        second.room_manager.set_language(room.code, "g1", None)
+        await asyncio.sleep(0.2)
+        assert first.room_manager.language_groups(room.code) == {"es": {"g0"}}
+        assert (await first.backend.load_room(room.code))["languages"] == {"g0": "es"}
+        for node in (first, second, third):
+            await node.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from tools.transcript_history import SQLiteTranscriptStore, TranscriptHistory, history_key
+
+def test_reused_code_after_restart_starts_empty(tmp_path):
+    path = str(tmp_path / "history.db")
+    old_room = SimpleNamespace(code="ABCDE", created_at=datetime(2026, 1, 1, 9, 0))
+    history = TranscriptHistory(max_segments=2, store=SQLiteTranscriptStore(path))
+    for index in range(3):
+        history.append(history_key(old_room), f"old secret {index}", 1.0, datetime(2026, 1, 1, 9, index).isoformat())
+    history.close()
+
+    # After a restart the code is handed to a new room
+    new_room = SimpleNamespace(code="ABCDE", created_at=datetime.now())
+    history = TranscriptHistory(max_segments=2, store=SQLiteTranscriptStore(path))
+    segment_id = history.append(history_key(new_room), "new room first line", 1.0, datetime.now().isoformat())
+    replay = history.replay(history_key(new_room))
+    assert segment_id == 1
+    assert [segment["text"] for segment in replay["segments"]] == ["new room first line"]
+
+    # The old room's rows are only in the store and old, so pruning removes them
+    assert history.prune(lambda key: key == history_key(new_room)) == 1
+    assert history_key(old_room) not in history.store.rooms()
+    history.close()
+
+def test_prune_keeps_recent_stored_rooms(tmp_path):
+    store = SQLiteTranscriptStore(str(tmp_path / "history.db"))
+    room = SimpleNamespace(code="FGHIJ", created_at=datetime.now())
+    history = TranscriptHistory(max_segments=1, store=store)
+    history.append(history_key(room), "line", 1.0, (datetime.now() - timedelta(minutes=5)).isoformat())
+    history.close()
+
+    history = TranscriptHistory(store=SQLiteTranscriptStore(str(tmp_path / "history.db")))
+    # Not known locally, but recent: another node may still serve it
+    assert history.prune(lambda key: False) == 0
+    assert set(history.store.rooms()) == {history_key(room)}
+    history.close()
+
+def test_queued_writes_are_visible_to_replay_in_order(tmp_path):
+    room = SimpleNamespace(code="KLMNO", created_at=datetime.now())
+    key = history_key(room)
+    history = TranscriptHistory(max_segments=1, store=SQLiteTranscriptStore(str(tmp_path / "history.db")))
+    for index in range(50):
+        history.append(key, f"line {index}", 1.0, datetime.now().isoformat())
+    # Translation of a segment that was spilled moments ago, while its write may still be queued
+    history.add_translation(key, 1, "es", "línea 0")
+
+    replay = history.replay(key, limit=100)
+    assert [segment["segment_id"] for segment in replay["segments"]] == list(range(1, 51))
+    assert replay["segments"][0]["translations"] == {"es": "línea 0"}
+    history.close()
@@ -0,0 +1,37 @@
+import asyncio
+
+from tools.translation_scheduler import RoomTranslationScheduler
+
+class RecordingConnections:
+    def __init__(self):
+        self.sent = []
+
+    async def send_to_users(self, user_ids, message):
+        self.sent.append((sorted(user_ids), message))
+
+def runner(text):
+    async def run(on_partial):
+        await asyncio.sleep(0)
+        return f"[es] {text}"
+    return run
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_cancel_before_start_releases_slot():
+    async def scenario():
+        connections = RecordingConnections()
+        scheduler = RoomTranslationScheduler(connections, max_concurrency=1)
+        await scheduler.submit(1, "first", {"es": {"a"}}, {"es": runner("first")})
+        # The job's task exists but hasn't taken its first step yet
+        scheduler.cancel_user("a")
+        await settle()
+        assert scheduler.stats()["running"] == 0
+
+        await scheduler.submit(2, "second", {"es": {"b"}}, {"es": runner("second")})
+        await settle()
+        assert scheduler.stats()["running"] == 0
+        assert [message["text"] for _, message in connections.sent] == ["[es] second"]
+
+    asyncio.run(scenario())
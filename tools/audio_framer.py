@@ -0,0 +1,79 @@
+# tools/audio_framer.py
+from typing import List
+
+class AudioReframer:
+    """Re-frames incoming 16-bit PCM into fixed-duration chunks using a preallocated ring buffer."""
+
+    def __init__(self, sample_rate: int = 16_000, frame_ms: int = 100, max_buffer_ms: int = 2000, sample_width: int = 2):
+        """
+        Args:
+            sample_rate (int): Samples per second of the incoming audio
+            frame_ms (int): Duration of each emitted frame in milliseconds
+            max_buffer_ms (int): Most audio held while waiting for a full frame;
+                older audio is dropped beyond this
+            sample_width (int): Bytes per sample
+        """
+        self.sample_width = sample_width
+        self.frame_bytes = max(1, sample_rate * frame_ms // 1000) * sample_width
+        capacity = max(sample_rate * max_buffer_ms // 1000 * sample_width, self.frame_bytes)
+        # Round up to whole frames so a full frame never straddles more than one wrap
+        self.capacity = -(-capacity // self.frame_bytes) * self.frame_bytes
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._size = 0
+        self.dropped_bytes = 0
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._size
+
+    def push(self, data: bytes) -> List[bytes]:
+        """Append audio and return every complete frame now available."""
+        data = memoryview(data)
+        if len(data) > self.capacity:
+            # Only the most recent audio can fit
+            excess = len(data) - self.capacity
+            excess += -excess % self.sample_width
+            self.dropped_bytes += excess + self._size
+            data = data[excess:]
+            self._start = 0
+            self._size = 0
+
+        overflow = self._size + len(data) - self.capacity
+        if overflow > 0:
+            # Drop the oldest whole samples to make room
+            overflow += -overflow % self.sample_width
+            self._start = (self._start + overflow) % self.capacity
+            self._size -= overflow
+            self.dropped_bytes += overflow
+
+        self._write(data)
+
+        frames = []
+        while self._size >= self.frame_bytes:
+            frames.append(self._read(self.frame_bytes))
+        return frames
+
+    def flush(self) -> bytes:
+        """Return whatever audio is left, even if shorter than a frame."""
+        return self._read(self._size)
+
+    def _write(self, data: memoryview):
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._view[end:end + first] = data[:first]
+        if first < len(data):
+            self._view[:len(data) - first] = data[first:]
+        self._size += len(data)
+
+    def _read(self, length: int) -> bytes:
+        start = self._start
+        first = min(length, self.capacity - start)
+        if first == length:
+            chunk = bytes(self._view[start:start + length])
+        else:
+            chunk = bytes(self._view[start:]) + bytes(self._view[:length - first])
+        self._start = (start + length) % self.capacity
+        self._size -= length
+        return chunk
@@ -0,0 +1,561 @@
+# tools/cluster.py
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from tools.logging_config import get_logger
+
+log = get_logger("cluster")
+
+# Receives (channel, message) for every message published on a subscribed channel
+MessageHandler = Callable[[str, dict], Awaitable[None]]
+
+STATE_CHANNEL = "state"
+
+def room_channel(room_code: str) -> str:
+    return f"room:{room_code}"
+
+class ClusterBackend:
+    """
+    Shared room state and pub/sub between Echo processes.
+
+    Rooms are stored as JSON documents keyed by code, with each room's guests
+    and their languages kept next to them so nodes change individual members
+    without overwriting each other, and a user to room index. Messages are
+    dicts published on named channels and delivered, including to the
+    publisher, for every channel the node subscribed to.
+    """
+    # False when there are no other processes to share with
+    shared = True
+
+    async def start(self, handler: MessageHandler):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    async def save_room(self, room_code: str, data: dict, added: Set[str], removed: Set[str], languages: Dict[str, Optional[str]] = None):
+        """Store a room's status (data without guests or languages), add and remove guests and set or clear (None) their languages."""
+        raise NotImplementedError
+
+    async def delete_room(self, room_code: str):
+        raise NotImplementedError
+
+    async def load_room(self, room_code: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def find_user_room(self, user_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryClusterBackend(ClusterBackend):
+    """Single-process default: the local RoomManager is the only copy of the state."""
+    shared = False
+
+    async def start(self, handler: MessageHandler):
+        pass
+
+    async def subscribe(self, channel: str):
+        pass
+
+    async def unsubscribe(self, channel: str):
+        pass
+
+    async def publish(self, channel: str, message: dict):
+        pass
+
+    async def save_room(self, room_code: str, data: dict, added: Set[str], removed: Set[str], languages: Dict[str, Optional[str]] = None):
+        pass
+
+    async def delete_room(self, room_code: str):
+        pass
+
+    async def load_room(self, room_code: str) -> Optional[dict]:
+        return None
+
+    async def find_user_room(self, user_id: str) -> Optional[str]:
+        return None
+
+class RedisClusterBackend(ClusterBackend):
+    """
+    Shares state through Redis hashes and fans out with Redis pub/sub.
+
+    Any client with the redis.asyncio API (decoding responses to str) can
+    be injected, such as LocalRedis in tests. Room status is last writer
+    wins; guests are a Redis set per room changed with SADD/SREM and their
+    languages a Redis hash per room, so joins and language choices through
+    different nodes are never lost.
+    """
+
+    def __init__(self, client=None, prefix: str = None):
+        """
+        Args:
+            client: redis.asyncio client, defaults to one connected to REDIS_URL
+            prefix (str): Key and channel prefix, defaults to CLUSTER_KEY_PREFIX or echo
+        """
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise ValueError("The redis package is required for CLUSTER_BACKEND=redis") from e
+            client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        self.client = client
+        self.prefix = prefix or os.getenv("CLUSTER_KEY_PREFIX", "echo")
+        self._rooms_key = f"{self.prefix}:rooms"
+        self._users_key = f"{self.prefix}:users"
+        self._pubsub = None
+        self._handler: Optional[MessageHandler] = None
+        # Subscription changes are applied by the listener so only one task uses the pubsub connection
+        self._pending: deque = deque()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, channel: str) -> str:
+        return f"{self.prefix}:{channel}"
+
+    def _guests_key(self, room_code: str) -> str:
+        return f"{self.prefix}:guests:{room_code}"
+
+    def _languages_key(self, room_code: str) -> str:
+        return f"{self.prefix}:languages:{room_code}"
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+        self._pubsub = self.client.pubsub()
+        # Something must be subscribed before the listener can poll
+        await self._pubsub.subscribe(self._channel(STATE_CHANNEL))
+        self._listener = asyncio.create_task(self._listen())
+
+    async def subscribe(self, channel: str):
+        self._pending.append(("subscribe", self._channel(channel)))
+
+    async def unsubscribe(self, channel: str):
+        self._pending.append(("unsubscribe", self._channel(channel)))
+
+    async def _listen(self):
+        strip = len(self.prefix) + 1
+        while True:
+            try:
+                while self._pending:
+                    action, channel = self._pending.popleft()
+                    await getattr(self._pubsub, action)(channel)
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=0.05)
+                if message is None or message.get("type") != "message":
+                    continue
+                await self._handler(message["channel"][strip:], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Cluster message error: %s", e)
+
+    async def publish(self, channel: str, message: dict):
+        await self.client.publish(self._channel(channel), json.dumps(message, separators=(",", ":")))
+
+    async def save_room(self, room_code: str, data: dict, added: Set[str], removed: Set[str], languages: Dict[str, Optional[str]] = None):
+        await self.client.hset(self._rooms_key, room_code, json.dumps(data))
+        guests_key = self._guests_key(room_code)
+        languages_key = self._languages_key(room_code)
+        if added:
+            await self.client.sadd(guests_key, *added)
+        if removed:
+            await self.client.srem(guests_key, *removed)
+            await self.client.hdel(self._users_key, *removed)
+        chosen = {user_id: language for user_id, language in (languages or {}).items() if language}
+        cleared = {user_id for user_id, language in (languages or {}).items() if not language} | set(removed)
+        if chosen:
+            await self.client.hset(languages_key, mapping=chosen)
+        if cleared:
+            await self.client.hdel(languages_key, *cleared)
+        if data["is_active"]:
+            await self.client.hset(self._users_key, mapping={user_id: room_code for user_id in {data["host_id"], *added}})
+        else:
+            await self.client.hdel(self._users_key, data["host_id"], *await self.client.smembers(guests_key))
+
+    async def delete_room(self, room_code: str):
+        data = await self.client.hget(self._rooms_key, room_code)
+        guests_key = self._guests_key(room_code)
+        members = set(await self.client.smembers(guests_key))
+        if data:
+            members.add(json.loads(data)["host_id"])
+        await self.client.hdel(self._rooms_key, room_code)
+        await self.client.delete(guests_key, self._languages_key(room_code))
+        if members:
+            await self.client.hdel(self._users_key, *members)
+
+    async def load_room(self, room_code: str) -> Optional[dict]:
+        data = await self.client.hget(self._rooms_key, room_code)
+        if not data:
+            return None
+        room = json.loads(data)
+        room["guests"] = sorted(await self.client.smembers(self._guests_key(room_code)))
+        room["languages"] = await self.client.hgetall(self._languages_key(room_code))
+        return room
+
+    async def find_user_room(self, user_id: str) -> Optional[str]:
+        return await self.client.hget(self._users_key, user_id)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self.client.aclose()
+
+class LocalRedis:
+    """
+    In-process stand-in for the part of redis.asyncio that RedisClusterBackend uses.
+
+    Several nodes sharing one instance behave like processes sharing a
+    Redis server, so cross-node behaviour can be exercised without one.
+    """
+
+    def __init__(self):
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._sets: Dict[str, Set[str]] = {}
+        self._subscribers: Dict[str, Set["_LocalPubSub"]] = {}
+
+    async def hset(self, name: str, key: str = None, value: str = None, mapping: Dict[str, str] = None) -> int:
+        values = self._hashes.setdefault(name, {})
+        updates = dict(mapping or {})
+        if key is not None:
+            updates[key] = value
+        added = len(updates.keys() - values.keys())
+        values.update(updates)
+        return added
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        return self._hashes.get(name, {}).get(key)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._hashes.get(name, {}))
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        values = self._hashes.get(name, {})
+        return sum(values.pop(key, None) is not None for key in keys)
+
+    async def sadd(self, name: str, *values: str) -> int:
+        members = self._sets.setdefault(name, set())
+        added = len(set(values) - members)
+        members.update(values)
+        return added
+
+    async def srem(self, name: str, *values: str) -> int:
+        members = self._sets.get(name, set())
+        removed = len(members & set(values))
+        members.difference_update(values)
+        if not members:
+            self._sets.pop(name, None)
+        return removed
+
+    async def smembers(self, name: str) -> Set[str]:
+        return set(self._sets.get(name, ()))
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._sets.pop(name, None) is not None or self._hashes.pop(name, None) is not None for name in names)
+
+    async def publish(self, channel: str, message: str) -> int:
+        subscribers = self._subscribers.get(channel, ())
+        for pubsub in subscribers:
+            pubsub._messages.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(subscribers)
+
+    def pubsub(self) -> "_LocalPubSub":
+        return _LocalPubSub(self)
+
+    async def aclose(self):
+        pass
+
+class _LocalPubSub:
+    def __init__(self, server: LocalRedis):
+        self._server = server
+        self._messages: asyncio.Queue = asyncio.Queue()
+        self.channels: Set[str] = set()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self._server._subscribers.setdefault(channel, set()).add(self)
+            self.channels.add(channel)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels:
+            self._server._subscribers.get(channel, set()).discard(self)
+            self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        await self.unsubscribe(*list(self.channels))
+
+BACKENDS = {
+    "memory": MemoryClusterBackend,
+    "redis": RedisClusterBackend
+}
+
+def create_cluster_backend(name: str = None) -> ClusterBackend:
+    """Create the backend named by name or CLUSTER_BACKEND (default memory)."""
+    name = (name or os.getenv("CLUSTER_BACKEND", "memory")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown cluster backend: {name}")
+    return BACKENDS[name]()
+
+class ClusterNode:
+    """
+    Keeps this process's rooms and connections in step with the other nodes.
+
+    Room changes are saved to the backend and published on the state
+    channel so every node holds a current copy and lookups stay local.
+    Guests and their languages travel as changes against the state this
+    node last synced, so concurrent joins and language choices through
+    different nodes merge instead of the last writer's copy replacing the
+    other's.
+    Frames for room members connected to another node are published on
+    the room's channel, which only nodes with a member of that room
+    connected subscribe to. Control messages (such as a guest's language
+    preference) travel the same way to the node running the transcriber.
+    With the memory backend every method is a cheap no-op.
+    """
+
+    def __init__(self, backend: ClusterBackend, room_manager, connection_manager, node_id: str = None, heartbeat_seconds: float = None):
+        """
+        Args:
+            backend (ClusterBackend): Shared state and pub/sub
+            room_manager (RoomManager): This process's rooms
+            connection_manager (ConnectionManager): This process's WebSockets
+            node_id (str): Unique name for this process, random by default
+            heartbeat_seconds (float): How often local users' activity is shared,
+                defaults to CLUSTER_HEARTBEAT_SECONDS or 60
+        """
+        self.backend = backend
+        self.room_manager = room_manager
+        self.connection_manager = connection_manager
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self.heartbeat_seconds = heartbeat_seconds or float(os.getenv("CLUSTER_HEARTBEAT_SECONDS", "60"))
+        self.shared = backend.shared
+        # Handles control messages for rooms whose transcriber runs here
+        self.on_control: Optional[Callable[[str, dict], Awaitable[None]]] = None
+        self._watched: Dict[str, int] = {}  # Room code to local connections in it
+        self._guests: Dict[str, Set[str]] = {}  # Guests last saved or received for each room
+        self._languages: Dict[str, Dict[str, str]] = {}  # Guests' languages last saved or received for each room
+        self._changes: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.published = 0
+        self.received = 0
+        self.forwarded_frames = 0
+
+    async def start(self):
+        if not self.shared:
+            return
+        self._changes = asyncio.Queue()
+        self.room_manager.on_change = self._changes.put_nowait
+        self.connection_manager.cluster = self
+        await self.backend.start(self._on_message)
+        self._tasks = [
+            asyncio.create_task(self._publish_changes()),
+            asyncio.create_task(self._publish_activity())
+        ]
+        log.info("Cluster node %s started", self.node_id)
+
+    async def _publish(self, channel: str, message: dict):
+        message["node"] = self.node_id
+        self.published += 1
+        await self.backend.publish(channel, message)
+
+    async def _publish_changes(self):
+        """Save and announce room changes in the order they happened."""
+        while True:
+            room_code = await self._changes.get()
+            try:
+                room = self.room_manager.get_room(room_code)
+                if room is None:
+                    self._guests.pop(room_code, None)
+                    self._languages.pop(room_code, None)
+                    await self.backend.delete_room(room_code)
+                    await self._publish(STATE_CHANNEL, {"kind": "room_deleted", "code": room_code})
+                    continue
+                known = self._guests.get(room_code, set())
+                added, removed = room.guests - known, known - room.guests
+                self._guests[room_code] = set(room.guests)
+                synced = self._languages.get(room_code, {})
+                languages = {
+                    user_id: room.member_languages.get(user_id)
+                    for user_id in synced.keys() | room.member_languages.keys()
+                    if room.member_languages.get(user_id) != synced.get(user_id)
+                }
+                self._languages[room_code] = dict(room.member_languages)
+                data = room.to_dict()
+                del data["guests"], data["languages"]
+                await self.backend.save_room(room_code, data, added, removed, languages)
+                await self._publish(STATE_CHANNEL, {
+                    "kind": "room",
+                    # The sender's full copy seeds nodes that don't have the room yet
+                    "room": {**data, "guests": sorted(room.guests), "languages": dict(room.member_languages)},
+                    "added": sorted(added),
+                    "removed": sorted(removed),
+                    "languages": languages
+                })
+            except Exception as e:
+                log.error("Error publishing change to room %s: %s", room_code, e)
+
+    async def _publish_activity(self):
+        """Tell other nodes which users are connected here so their cleanup keeps them."""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            users = list(self.connection_manager.active_connections)
+            if users:
+                try:
+                    await self._publish(STATE_CHANNEL, {"kind": "activity", "users": users})
+                except Exception as e:
+                    log.warning("Error publishing activity: %s", e)
+
+    def _apply(self, data: dict, added: Iterable[str] = None, removed: Iterable[str] = None, languages: Dict[str, Optional[str]] = None):
+        """
+        Merge a room from another node or the backend into the local copy.
+
+        Without added/removed, data["guests"] is a full list and the change
+        is worked out against the guests this node last synced; likewise
+        data["languages"] without languages (user to language, None when
+        cleared). Local changes not yet published are kept either way.
+        """
+        code = data["code"]
+        room = self.room_manager.get_room(code)
+        known = self._guests.get(code, set())
+        if added is None or room is None:
+            stored = set(data["guests"])
+            added, removed = stored - known, known - stored
+        else:
+            added, removed = set(added), set(removed)
+        self._guests[code] = (known | added) - removed
+
+        synced = self._languages.get(code, {})
+        if languages is None or room is None:
+            stored_languages = data.get("languages", {})
+            languages = {
+                user_id: stored_languages.get(user_id)
+                for user_id in synced.keys() | stored_languages.keys()
+                if stored_languages.get(user_id) != synced.get(user_id)
+            }
+        merged = {**synced, **languages}
+        self._languages[code] = {user_id: language for user_id, language in merged.items() if language}
+        merged = {**(room.member_languages if room is not None else {}), **languages}
+
+        local = room.guests if room is not None else set()
+        return self.room_manager.apply_snapshot({
+            **data,
+            "guests": sorted((local | added) - removed),
+            "languages": {user_id: language for user_id, language in merged.items() if language}
+        })
+
+    async def _on_message(self, channel: str, message: dict):
+        if message.get("node") == self.node_id:
+            return
+        self.received += 1
+        kind = message.get("kind")
+        if kind == "frame":
+            self.connection_manager.deliver_local(
+                message["room"], message["type"], message["frame"],
+                user_ids=message.get("users"), exclude_user=message.get("exclude")
+            )
+        elif kind == "control":
+            if self.on_control:
+                await self.on_control(message["room"], message["message"])
+        elif kind == "room":
+            self._apply(message["room"], message.get("added"), message.get("removed"), message.get("languages"))
+        elif kind == "room_deleted":
+            self._guests.pop(message["code"], None)
+            self._languages.pop(message["code"], None)
+            self.room_manager.discard_room(message["code"])
+        elif kind == "activity":
+            now = time.monotonic()
+            for user_id in message["users"]:
+                room = self.room_manager.get_user_room(user_id)
+                if room:
+                    room.user_last_active[user_id] = now
+
+    async def ensure_room(self, room_code: str):
+        """Return a room, loading it from the backend if this node hasn't seen it yet."""
+        room = self.room_manager.get_room(room_code)
+        if room is not None or not self.shared:
+            return room
+        data = await self.backend.load_room(room_code)
+        return self._apply(data) if data else None
+
+    async def ensure_user_room(self, user_id: str):
+        """Return a user's room, loading it from the backend if they joined through another node."""
+        room = self.room_manager.get_user_room(user_id)
+        if room is not None or not self.shared:
+            return room
+        room_code = await self.backend.find_user_room(user_id)
+        if not room_code:
+            return None
+        # The local copy may predate the join, so always take the stored one
+        data = await self.backend.load_room(room_code)
+        if data:
+            self._apply(data)
+        return self.room_manager.get_user_room(user_id)
+
+    async def watch_room(self, room_code: str):
+        """Receive the room's frames and control messages while a member is connected here."""
+        if not self.shared:
+            return
+        self._watched[room_code] = self._watched.get(room_code, 0) + 1
+        if self._watched[room_code] == 1:
+            await self.backend.subscribe(room_channel(room_code))
+
+    async def unwatch_room(self, room_code: str):
+        if not self.shared or room_code not in self._watched:
+            return
+        self._watched[room_code] -= 1
+        if self._watched[room_code] == 0:
+            del self._watched[room_code]
+            await self.backend.unsubscribe(room_channel(room_code))
+
+    async def forward(self, room_code: str, message_type: str, frame: str, user_ids: Iterable[str] = None, exclude_user: str = None):
+        """Publish an encoded frame for room members connected to other nodes (all members when user_ids is None)."""
+        if not self.shared:
+            return
+        self.forwarded_frames += 1
+        await self._publish(room_channel(room_code), {
+            "kind": "frame",
+            "room": room_code,
+            "type": message_type,
+            "frame": frame,
+            "users": list(user_ids) if user_ids is not None else None,
+            "exclude": exclude_user
+        })
+
+    async def send_control(self, room_code: str, message: dict) -> bool:
+        """Send a control message to the node running the room's transcriber. Returns False on a single node."""
+        if not self.shared:
+            return False
+        await self._publish(room_channel(room_code), {"kind": "control", "room": room_code, "message": message})
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "shared": self.shared,
+            "watched_rooms": len(self._watched),
+            "published": self.published,
+            "received": self.received,
+            "forwarded_frames": self.forwarded_frames
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await self.backend.close()
@@ -0,0 +1,386 @@
+# tools/connection_manager.py
+from dataclasses import dataclass, field
+from collections import deque
+from typing import Dict, FrozenSet, Optional
+from datetime import datetime
+from fastapi import WebSocket
+import asyncio
+import os
+import time
+
+from tools.logging_config import get_logger
+from tools.metrics import STAGES
+from tools.wire_protocol import JSON, EncodedMessage, Frame, encode_message, negotiate
+
+log = get_logger("connections")
+# Per-message events, sampled when debug logging is on
+send_log = get_logger("connections.sends", sampled=True)
+
+@dataclass
+class SlowConsumerPolicy:
+    """How a connection's outbound queue behaves when the client can't keep up."""
+    # Beyond this depth queued droppable messages are shed, oldest first
+    max_queue_size: int = 64
+    # Message types that are superseded by the next message of the same type
+    droppable_types: FrozenSet[str] = field(default_factory=lambda: frozenset({"partial", "translation_partial"}))
+    # Close the socket once this many non-droppable messages are waiting
+    disconnect_threshold: int = 256
+    # Close the socket once a single send has been blocked this many seconds
+    send_timeout: float = 30.0
+    close_code: int = 1013  # Try again later
+
+    @classmethod
+    def from_env(cls) -> "SlowConsumerPolicy":
+        """Build a policy from WS_OUTBOUND_QUEUE_SIZE, WS_SLOW_CONSUMER_THRESHOLD and WS_SEND_TIMEOUT."""
+        return cls(
+            max_queue_size=int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "64")),
+            disconnect_threshold=int(os.getenv("WS_SLOW_CONSUMER_THRESHOLD", "256")),
+            send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "30"))
+        )
+
+class CoarseClock:
+    """time.monotonic() sampled every resolution seconds, so hot paths can read the time for free."""
+    __slots__ = ("resolution", "now", "_task")
+
+    def __init__(self, resolution: float = None):
+        """
+        Args:
+            resolution (float): Seconds between samples, defaults to ACTIVITY_CLOCK_RESOLUTION or 1
+        """
+        self.resolution = resolution or float(os.getenv("ACTIVITY_CLOCK_RESOLUTION", "1"))
+        self.now = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.now = time.monotonic()
+            self._task = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.resolution)
+            self.now = time.monotonic()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class _OutboundEntry:
+    __slots__ = ("type", "frame", "dropped")
+
+    def __init__(self, message_type: str, frame: Frame):
+        self.type = message_type
+        self.frame = frame
+        self.dropped = False
+
+class ClientConnection:
+    """
+    Everything tracked for one connected user: the WebSocket and the wire
+    protocol it negotiated, their role, room and language, liveness, and a
+    bounded outbound queue.
+
+    The sender task only exists while there is something to send, so idle
+    connections cost no task.
+    """
+    __slots__ = (
+        "user_id", "websocket", "protocol", "role", "room", "language", "policy", "on_slow_consumer", "clock",
+        "last_active", "queue", "depth", "dropped", "closed", "_latest", "sender_task", "send_started"
+    )
+
+    def __init__(self, user_id: str, websocket: WebSocket, policy: SlowConsumerPolicy, on_slow_consumer=None, clock: CoarseClock = None, protocol: str = JSON):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.protocol = protocol  # JSON text or MessagePack binary frames
+        self.role: Optional[str] = None  # "host" or "guest" once bound to a room
+        self.room = None  # The Room this connection is attached to
+        self.language: Optional[str] = None  # Guest's translation target
+        self.policy = policy
+        self.on_slow_consumer = on_slow_consumer
+        self.clock = clock or CoarseClock()
+        self.last_active = self.clock.now  # Monotonic seconds, refreshed by touch()
+        self.queue: deque = deque()
+        self.depth = 0  # Entries in the queue that will actually be sent; the rest are dropped tombstones
+        self.dropped = 0
+        self.closed = False
+        self._latest: Dict[str, _OutboundEntry] = {}
+        self.sender_task: Optional[asyncio.Task] = None
+        self.send_started: Optional[float] = None  # Coarse clock time the in-flight send began
+
+    def touch(self):
+        """Record activity; cheap enough to call for every received frame."""
+        self.last_active = self.clock.now
+
+    def enqueue(self, message_type: str, frame: Frame) -> bool:
+        """Queue a pre-encoded frame without waiting for the socket. Returns False if it was not queued."""
+        if self.closed:
+            return False
+        if self.send_started is not None and self.clock.now - self.send_started > self.policy.send_timeout:
+            self._disconnect_slow_consumer("a send blocked for over %.0fs" % self.policy.send_timeout)
+            return False
+
+        if message_type in self.policy.droppable_types:
+            stale = self._latest.get(message_type)
+            if stale is not None and not stale.dropped:
+                if self.queue and self.queue[-1] is stale:
+                    # Newer partial replaces the queued one in place
+                    stale.frame = frame
+                    self.dropped += 1
+                    return True
+                self._drop(stale)
+
+        entry = _OutboundEntry(message_type, frame)
+        self.queue.append(entry)
+        self.depth += 1
+        if message_type in self.policy.droppable_types:
+            self._latest[message_type] = entry
+
+        if self.depth > self.policy.max_queue_size:
+            self._shed_load()
+        if len(self.queue) > self.depth + self.policy.max_queue_size:
+            self._compact()
+        if self.sender_task is None and not self.closed:
+            self.sender_task = asyncio.create_task(self._run_sender())
+        return True
+
+    def _shed_load(self):
+        """Drop the oldest droppable messages, disconnecting if only essential ones remain."""
+        for entry in self.queue:
+            if self.depth <= self.policy.max_queue_size:
+                return
+            if not entry.dropped and entry.type in self.policy.droppable_types:
+                self._drop(entry)
+
+        if self.depth > self.policy.disconnect_threshold:
+            self._disconnect_slow_consumer("%d queued messages" % self.depth)
+
+    def _drop(self, entry: _OutboundEntry):
+        """Turn a queued entry into a tombstone, releasing its frame straight away."""
+        entry.dropped = True
+        entry.frame = None
+        self.depth -= 1
+        self.dropped += 1
+
+    def _compact(self):
+        """Remove tombstones so a stalled socket can't grow the queue past depth + max_queue_size."""
+        self.queue = deque(entry for entry in self.queue if not entry.dropped)
+        self._latest = {message_type: entry for message_type, entry in self._latest.items() if not entry.dropped}
+
+    def _disconnect_slow_consumer(self, reason: str):
+        log.warning("User %s is too slow (%s), disconnecting", self.user_id, reason)
+        self.closed = True
+        asyncio.create_task(self._close_slow_consumer())
+
+    async def _run_sender(self):
+        """Drain the queue onto the socket, one message at a time, then exit."""
+        try:
+            while self.queue:
+                entry = self.queue.popleft()
+                if self._latest.get(entry.type) is entry:
+                    del self._latest[entry.type]
+                if entry.dropped:
+                    continue
+                self.depth -= 1
+                self.send_started = self.clock.now
+                if isinstance(entry.frame, bytes):
+                    await self.websocket.send_bytes(entry.frame)
+                else:
+                    await self.websocket.send_text(entry.frame)
+                self.send_started = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Error sending message to user %s: %s", self.user_id, e)
+            self.closed = True
+        finally:
+            self.sender_task = None
+            self.send_started = None
+
+    async def _close_slow_consumer(self):
+        if self.sender_task:
+            self.sender_task.cancel()
+        self.queue.clear()
+        self.depth = 0
+        if self.on_slow_consumer:
+            self.on_slow_consumer(self)
+        try:
+            await self.websocket.close(code=self.policy.close_code, reason="Client too slow")
+        except Exception as e:
+            log.warning("Error closing slow connection for user %s: %s", self.user_id, e)
+
+    def close(self):
+        """Stop the sender task and discard anything still queued."""
+        self.closed = True
+        if self.sender_task:
+            self.sender_task.cancel()
+        self.queue.clear()
+        self.depth = 0
+
+class ConnectionManager:
+    """Tracks WebSocket connections and fans messages out to room members."""
+
+    def __init__(self, room_manager, policy: Optional[SlowConsumerPolicy] = None):
+        self.room_manager = room_manager
+        self.policy = policy or SlowConsumerPolicy.from_env()
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.slow_consumer_disconnects = 0
+        # Shared by every connection so recording activity never reads the system clock
+        self.clock = CoarseClock()
+        # Set by ClusterNode when other processes share the rooms
+        self.cluster = None
+
+    async def connect(self, user_id: str, websocket: WebSocket) -> ClientConnection:
+        """Connect a new user, speaking the first protocol they offered that the server supports."""
+        subprotocol, protocol = negotiate(websocket.scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=subprotocol)
+        self.clock.start()
+        previous = self.active_connections.get(user_id)
+        if previous:
+            previous.close()
+            if previous.room:
+                previous.room.detach(previous)
+        connection = self.active_connections[user_id] = ClientConnection(
+            user_id, websocket, self.policy, on_slow_consumer=self._on_slow_consumer, clock=self.clock, protocol=protocol
+        )
+        log.info("User %s connected (%s). Total connections: %d", user_id, protocol, len(self.active_connections))
+        return connection
+
+    def bind(self, connection: ClientConnection, room, role: str):
+        """Attach a connection to its room so broadcasts reach it."""
+        connection.room = room
+        connection.role = role
+        room.attach(connection)
+
+    def disconnect(self, connection: ClientConnection) -> bool:
+        """
+        Disconnect one of a user's connections.
+
+        Returns False, leaving the user connected, when a reconnect has
+        already replaced this connection.
+        """
+        connection.close()
+        user_id = connection.user_id
+        if self.active_connections.get(user_id) is not connection:
+            return False
+        del self.active_connections[user_id]
+        if connection.room:
+            connection.room.detach(connection)
+        # Keep the final activity time so inactivity cleanup counts from the disconnect
+        room = self.room_manager.get_user_room(user_id)
+        if room:
+            room.user_last_active[user_id] = connection.last_active
+        log.info("User %s disconnected. Total connections: %d", user_id, len(self.active_connections))
+        return True
+
+    def last_active(self, user_id: str) -> Optional[float]:
+        """Monotonic time of a connected user's last activity, or None if not connected here."""
+        connection = self.active_connections.get(user_id)
+        return connection.last_active if connection else None
+
+    def _on_slow_consumer(self, connection: ClientConnection):
+        self.slow_consumer_disconnects += 1
+
+    async def send_to_user(self, user_id: str, message: dict):
+        """Queue a message for a specific user."""
+        connection = self.active_connections.get(user_id)
+        if connection:
+            connection.enqueue(message.get("type"), EncodedMessage(message).frame(connection.protocol))
+        elif self.cluster:
+            await self._forward_to_users([user_id], message.get("type"), encode_message(message))
+        else:
+            send_log.debug("User %s not found in active connections", user_id)
+
+    async def send_to_users(self, user_ids, message: dict):
+        """Queue the same message for several users, encoding it only once per protocol."""
+        encoded = EncodedMessage(message)
+        remote = []
+        for user_id in user_ids:
+            connection = self.active_connections.get(user_id)
+            if connection:
+                connection.enqueue(encoded.type, encoded.frame(connection.protocol))
+            elif self.cluster:
+                remote.append(user_id)
+        if remote:
+            await self._forward_to_users(remote, encoded.type, encoded.json)
+
+    async def _forward_to_users(self, user_ids, message_type: str, frame: str):
+        """Hand frames for users connected to other nodes to the cluster, one publish per room."""
+        by_room: Dict[str, list] = {}
+        for user_id in user_ids:
+            room = self.room_manager.get_user_room(user_id)
+            if room:
+                by_room.setdefault(room.code, []).append(user_id)
+        for room_code, members in by_room.items():
+            await self.cluster.forward(room_code, message_type, frame, user_ids=members)
+
+    def deliver_local(self, room_code: str, message_type: str, frame: str, user_ids=None, exclude_user: str = None):
+        """Queue a JSON frame published by another node for the recipients connected here."""
+        encoded = EncodedMessage(json_frame=frame, message_type=message_type)
+        if user_ids is None:
+            room = self.room_manager.get_room(room_code)
+            if room:
+                for connection in room.recipients:
+                    if connection.user_id != exclude_user:
+                        connection.enqueue(message_type, encoded.frame(connection.protocol))
+            return
+        for user_id in user_ids:
+            if user_id != exclude_user:
+                connection = self.active_connections.get(user_id)
+                if connection:
+                    connection.enqueue(message_type, encoded.frame(connection.protocol))
+
+    async def broadcast_to_room(self, room_code: str, message: dict, exclude_user: str = None):
+        """Queue a message for all users in a room without waiting on any socket."""
+        room = self.room_manager.get_room(room_code)
+        if not room:
+            send_log.debug("Room %s not found", room_code)
+            return
+
+        started_at = time.perf_counter()
+        # Encode once per protocol and share the same frame with every locally connected member
+        encoded = EncodedMessage(message)
+        message_type = encoded.type
+        send_log.debug("Broadcasting %s to room %s with %d members", message_type, room_code, len(room.member_ids))
+        for connection in room.recipients:
+            if connection.user_id != exclude_user:
+                connection.enqueue(message_type, encoded.frame(connection.protocol))
+
+        # Members not connected here may be connected to another node (frames travel as JSON)
+        if self.cluster and len(room.recipients) < len(room.member_ids):
+            await self.cluster.forward(room_code, message_type, encoded.json, exclude_user=exclude_user)
+        # Encoding and queueing only; the per-connection senders write to the sockets afterwards
+        STAGES.observe(time.perf_counter() - started_at, "broadcast")
+
+    async def update_participant_count(self, room_code: str):
+        """Broadcast updated participant count to all users in a room."""
+        room = self.room_manager.get_room(room_code)
+        if room:
+            await self.broadcast_to_room(
+                room_code,
+                {
+                    "type": "participant_count",
+                    "count": len(room.member_ids),  # Host and guests
+                    "timestamp": datetime.now().isoformat()
+                }
+            )
+
+    def close(self):
+        """Stop the activity clock."""
+        self.clock.stop()
+
+    def stats(self) -> dict:
+        """Report per-connection outbound queue depth and drop counters."""
+        protocols: Dict[str, int] = {}
+        for connection in self.active_connections.values():
+            protocols[connection.protocol] = protocols.get(connection.protocol, 0) + 1
+        return {
+            "connections": len(self.active_connections),
+            "protocols": protocols,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "queue_depths": {
+                user_id: connection.depth for user_id, connection in self.active_connections.items()
+            },
+            "dropped_messages": {
+                user_id: connection.dropped for user_id, connection in self.active_connections.items()
+            }
+        }
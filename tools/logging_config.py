@@ -0,0 +1,108 @@
+# tools/logging_config.py
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+
+ROOT_LOGGER = "echo"
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, level, logger and any extra= fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes one record in every `every` per message template.
+
+    Attached to loggers for high-frequency events (audio chunks, partials,
+    per-message sends) so enabling debug output doesn't flood the log.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        with self._lock:
+            count = self._counts.get(record.msg, 0)
+            self._counts[record.msg] = count + 1
+        if count % self.every:
+            return False
+        if count:
+            record.sampled_every = self.every
+        return True
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging(level: str = None, fmt: str = None) -> QueueListener:
+    """
+    Route every echo.* logger through a queue to a background writer thread.
+
+    The event loop only enqueues records; formatting and stderr I/O happen
+    on the listener thread. Safe to call more than once.
+
+    Args:
+        level (str): Level for echo.* loggers, defaults to LOG_LEVEL or INFO
+        fmt (str): "text" or "json", defaults to LOG_FORMAT or text
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+
+    output = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.addHandler(QueueHandler(records))
+    root.propagate = False
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_logger(subsystem: str, sampled: bool = False) -> logging.Logger:
+    """
+    Return the logger for a subsystem (echo.<subsystem>).
+
+    Sampled loggers keep one record in every LOG_SAMPLE_EVERY (default 100)
+    per message template; use them for high-frequency events.
+    """
+    logger = logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+    if sampled and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(int(os.getenv("LOG_SAMPLE_EVERY", "100"))))
+    return logger
@@ -0,0 +1,130 @@
+# tools/metrics.py
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import threading
+
+# Seconds; covers sub-millisecond fan-out up to slow translations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """
+    Prometheus-style histogram with one optional label.
+
+    observe() may be called from any thread; it costs a bisect and three
+    increments under a lock.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Label value to [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Optional[str], list] = {}
+
+    def observe(self, value: float, label_value: str = None):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Optional[str], dict]:
+        """Per label value: count, sum and cumulative bucket counts."""
+        with self._lock:
+            copies = {key: ([*series[0]], series[1], series[2]) for key, series in self._series.items()}
+        result = {}
+        for key, (counts, total, count) in copies.items():
+            cumulative, running = [], 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                cumulative.append((bound, running))
+            result[key] = {"count": count, "sum": total, "buckets": cumulative}
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.snapshot().items(), key=lambda item: item[0] or ""):
+            labels = f'{self.label}="{_escape(label_value)}"' if self.label and label_value is not None else ""
+            for bound, count in series["buckets"]:
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {count}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{suffix} {series['count']}")
+        return lines
+
+class Gauge:
+    """
+    Gauge read from a callback at scrape time, so nothing is updated on hot paths.
+
+    The callback returns a number, or a dict of label value to number.
+    """
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Union[float, Dict[str, float]]], label: str = None):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.label = label
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.read()
+        if isinstance(value, dict):
+            for label_value, item in sorted(value.items()):
+                lines.append(f'{self.name}{{{self.label}="{_escape(str(label_value))}"}} {_format_value(item)}')
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Histogram, Gauge]] = {}
+
+    def histogram(self, name: str, help_text: str, label: str = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the histogram called name, creating it on first use."""
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(name, help_text, label, buckets)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read: Callable, label: str = None) -> Gauge:
+        """Register (or replace) a callback gauge."""
+        metric = self._metrics[name] = Gauge(name, help_text, read, label)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # A broken gauge shouldn't take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+_registry = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+# Time spent in each step between host audio arriving and guests receiving text
+STAGES = get_metrics().histogram(
+    "echo_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    label="stage"
+)
@@ -0,0 +1,183 @@
+# tools/partial_coalescer.py
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+import os
+import threading
+
+def utf16_length(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit JavaScript string offsets use."""
+    return len(text.encode("utf-16-le")) // 2
+
+class PartialCoalescer:
+    """
+    Keeps only the latest partial transcript of a room and sends it at most max_rate times a second.
+
+    Transcription backends report partials from their own threads, often a
+    few milliseconds apart. offer() only stores the text; the event loop is
+    woken once per send interval rather than once per partial, and whatever
+    is latest at that point is sent. offer_final() wakes the loop right
+    away and drops the partial still waiting, since the final supersedes
+    it. Partials and finals are sent in the order they were offered; a
+    partial that arrived after a final goes out with it.
+
+    With diff enabled, updates after the first of a segment carry only the
+    text that changed: {"offset": n, "text": suffix}, where n is in UTF-16
+    code units. Every keyframe_every-th update resends the whole text, so a
+    client that missed an update (or joined mid-segment) recovers quickly.
+    Clients apply a diff only when its seq follows the last one they applied
+    (see applyPartial in templates/participant-view.html).
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        send_partial: Callable[[str, dict], Awaitable[None]],
+        send_final: Callable[[Any], Awaitable[None]],
+        observe: Callable[[str], None] = None,
+        max_rate: float = None,
+        diff: bool = None,
+        keyframe_every: int = None
+    ):
+        """
+        Args:
+            loop (AbstractEventLoop): Loop the partials are sent from
+            send_partial (callable): Coroutine function (full text, message fields) that broadcasts one partial
+            send_final (callable): Coroutine function handling one final, as passed to offer_final
+            observe (callable): Called on the loop with every partial flushed, including repeats that aren't broadcast
+            max_rate (float): Partials per second, defaults to PARTIAL_MAX_RATE_HZ or 10 (0 disables throttling)
+            diff (bool): Send only the changed suffix, defaults to PARTIAL_DIFF or false
+            keyframe_every (int): Full-text update interval in diff mode, defaults to PARTIAL_KEYFRAME_EVERY or 10
+        """
+        self.loop = loop
+        self.send_partial = send_partial
+        self.send_final = send_final
+        self.observe = observe
+        max_rate = max_rate if max_rate is not None else float(os.getenv("PARTIAL_MAX_RATE_HZ", "10"))
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.diff = diff if diff is not None else os.getenv("PARTIAL_DIFF", "false").lower() in ("1", "true", "yes")
+        self.keyframe_every = max(1, keyframe_every or int(os.getenv("PARTIAL_KEYFRAME_EVERY", "10")))
+        self._lock = threading.Lock()
+        self._latest: Optional[str] = None
+        self._finals: List[Any] = []
+        self._closed = False
+        self._wakeup_pending = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_sent_at = float("-inf")
+        # Last text sent in the current segment (None until its first partial)
+        self._sent_text: Optional[str] = None
+        self._seq = 0
+        self._since_keyframe = 0
+        # Most recent send; later sends (including the final) wait for it to preserve order
+        self._tail: Optional[asyncio.Future] = None
+        self.received = 0
+        self.sent = 0
+        self.diffs_sent = 0
+
+    def offer(self, text: str):
+        """Record the latest partial. Safe to call from any thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._latest = text
+            self.received += 1
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        self.loop.call_soon_threadsafe(self._schedule)
+
+    def offer_final(self, final: Any):
+        """Queue a final for immediate sending, dropping the partial it supersedes. Safe to call from any thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._finals.append(final)
+            self._latest = None
+        self.loop.call_soon_threadsafe(self._flush)
+
+    def _schedule(self):
+        if self._timer is not None:
+            return
+        delay = self._last_sent_at + self.interval - self.loop.time()
+        if delay > 0:
+            self._timer = self.loop.call_later(delay, self._flush)
+        else:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            finals, self._finals = self._finals, []
+            text = self._latest
+            self._latest = None
+            self._wakeup_pending = False
+        for final in finals:
+            # The next partial starts a new segment with its full text
+            self._sent_text = None
+            self._since_keyframe = 0
+            self._chain(self.send_final(final))
+        if text is None:
+            return
+        if self.observe:
+            self.observe(text)
+        if text == self._sent_text:
+            # Services repeat the partial while the speaker pauses; guests already have it
+            return
+        self._last_sent_at = self.loop.time()
+        self._chain(self.send_partial(text, self._fields(text)))
+
+    def _fields(self, text: str) -> dict:
+        """Message fields for text: the whole string, or the suffix that differs from the last one sent."""
+        self._seq += 1
+        fields = {"seq": self._seq}
+        previous = self._sent_text
+        self._sent_text = text
+        self.sent += 1
+        if not self.diff or previous is None or self._since_keyframe + 1 >= self.keyframe_every:
+            self._since_keyframe = 0
+            fields["text"] = text
+            return fields
+
+        common = 0
+        for a, b in zip(previous, text):
+            if a != b:
+                break
+            common += 1
+        self._since_keyframe += 1
+        self.diffs_sent += 1
+        fields["offset"] = utf16_length(text[:common])
+        fields["text"] = text[common:]
+        return fields
+
+    def _chain(self, coro: Awaitable) -> asyncio.Future:
+        """Run coro after every send already started, so messages leave in the order they were produced."""
+        previous = self._tail
+
+        async def run():
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            await coro
+
+        self._tail = self.loop.create_task(run())
+        return self._tail
+
+    def close(self):
+        """Stop sending; anything not yet handed to send_partial or send_final is dropped."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            self._closed = True
+            self._latest = None
+            self._finals = []
+
+    def stats(self) -> dict:
+        """Report how many partials were received and how many were actually broadcast."""
+        return {
+            "received": self.received,
+            "sent": self.sent,
+            "coalesced": self.received - self.sent,
+            "diffs_sent": self.diffs_sent,
+            "max_rate_hz": 1.0 / self.interval if self.interval else None
+        }
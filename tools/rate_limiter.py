@@ -0,0 +1,58 @@
+# tools/rate_limiter.py
+from typing import Dict
+import asyncio
+import os
+import time
+
+class TokenBucket:
+    """Async token bucket limiting how often requests are sent to a provider."""
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        Args:
+            rate (float): Tokens added per second (0 disables limiting)
+            burst (float): Bucket capacity, defaults to rate (at least 1)
+        """
+        self.rate = rate
+        self.capacity = burst if burst else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "TokenBucket":
+        """Build a bucket from TRANSLATION_RATE_LIMIT (requests/second) and TRANSLATION_RATE_BURST."""
+        return cls(
+            rate=float(os.getenv("TRANSLATION_RATE_LIMIT", "0")),
+            burst=float(os.getenv("TRANSLATION_RATE_BURST", "0"))
+        )
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until the requested tokens are available and take them."""
+        if self.rate <= 0:
+            return
+        # The lock keeps waiters first-come first-served
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                self.waits += 1
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "waits": self.waits,
+            "wait_seconds": self.wait_seconds
+        }
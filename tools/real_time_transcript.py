@@ -1,36 +1,99 @@
 import os
-import assemblyai as aai
-from dotenv import load_dotenv
 import json
 from fastapi import WebSocket
 import asyncio
-import queue
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
+import time
 
-from tools.text_translation import translate
+from tools.audio_framer import AudioReframer
+from tools.logging_config import get_logger
+from tools.metrics import STAGES
+from tools.partial_coalescer import PartialCoalescer
+from tools.speculative_translation import SpeculativeTranslator
+from tools.transcription_backends import TranscriptEvent, TranscriptionBackend, create_transcription_backend
+from tools.text_translation import get_translation_service
+from tools.transcript_history import get_transcript_history, history_key
+from tools.translation_batcher import get_translation_batcher
+from tools.translation_scheduler import RoomTranslationScheduler
+from tools.voice_activity import VoiceActivityDetector
+
+log = get_logger("transcription")
+# Per-chunk and per-transcript events, sampled when debug logging is on
+event_log = get_logger("transcription.events", sampled=True)
+
+_audio_executor: Optional[ThreadPoolExecutor] = None
+
+def get_audio_executor() -> ThreadPoolExecutor:
+    """Return the worker pool shared by every room for blocking transcription calls."""
+    global _audio_executor
+    if _audio_executor is None:
+        _audio_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("AUDIO_WORKERS", "8")),
+            thread_name_prefix="audio"
+        )
+    return _audio_executor
+
+def shutdown_audio_executor():
+    """Release the shared audio worker pool without waiting for running calls."""
+    global _audio_executor
+    if _audio_executor is not None:
+        _audio_executor.shutdown(wait=False, cancel_futures=True)
+        _audio_executor = None
 
 class RealTimeTranscriber:
-    def __init__(self, websocket: WebSocket, room_code: str, connection_manager, sample_rate=16_000):
+    def __init__(self, websocket: WebSocket, room_code: str, connection_manager, sample_rate=16_000, backend: str = None):
         self.websocket = websocket
         self.room_code = room_code
         self.connection_manager = connection_manager
+        # Guests' languages live in the room so they survive this transcriber
+        self.room_manager = connection_manager.room_manager
         self.sample_rate = sample_rate
-        self._initialize_api()
-        self.audio_queue = queue.Queue()
+        self.backend_name = backend
+        # Bounded buffer between the host socket and the transcription service
+        self.audio_queue: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv("AUDIO_QUEUE_MAX_CHUNKS", "50")))
+        self.backpressure_timeout = float(os.getenv("AUDIO_BACKPRESSURE_TIMEOUT", "0.5"))
+        self.dropped_chunks = 0
+        # Timing for the latency histograms, written on the loop and read from backend callbacks
+        self._audio_received_at: Optional[float] = None  # Arrival of the newest chunk handed to the backend
+        self._stream_started_at: Optional[float] = None
+        self._segment_started_at: Optional[float] = None  # First partial of the current utterance
+        # Re-frame browser-sized chunks into AUDIO_FRAME_MS frames (0 forwards chunks as received)
+        frame_ms = int(os.getenv("AUDIO_FRAME_MS", "100"))
+        self.framer = AudioReframer(
+            sample_rate=sample_rate,
+            frame_ms=frame_ms,
+            max_buffer_ms=int(os.getenv("AUDIO_MAX_BUFFER_MS", "2000"))
+        ) if frame_ms > 0 else None
+        # Optional silence suppression (AUDIO_VAD_MODE=drop|thin)
+        self.vad = VoiceActivityDetector.from_env(sample_rate=sample_rate)
         self.is_running = True
         self.loop = asyncio.get_event_loop()
+        self._stream_task: Optional[asyncio.Task] = None
+        # The transcriber call currently running in the worker pool, if any
+        self._in_flight: Optional[asyncio.Future] = None
         self._setup_transcriber()
-        self.user_languages = {}  # Dictionary to store user language preferences
-        print("RealTimeTranscriber initialized")  # Debug log
+        # Finals and translations kept for late joiners; also allocates segment ids
+        self.history = get_transcript_history()
+        self.history_key = history_key(self.room_manager.get_room(room_code))
+        # Orders, limits and cancels this room's translation work
+        self.scheduler = RoomTranslationScheduler(connection_manager)
+        # Stream translation tokens to guests instead of waiting for whole (batched) translations
+        self.stream_translations = os.getenv("TRANSLATION_STREAMING", "false").lower() in ("1", "true", "yes")
+        # Opt-in: start translating stable partial prefixes before the final arrives
+        self.speculator = SpeculativeTranslator(
+            lambda text, language: get_translation_service().translate(text, language)
+        ) if os.getenv("SPECULATIVE_TRANSLATION", "false").lower() in ("1", "true", "yes") else None
+        # Only the latest partial is broadcast, at most PARTIAL_MAX_RATE_HZ times a second
+        self.partials = PartialCoalescer(
+            self.loop,
+            self._send_partial,
+            self._handle_final,
+            observe=self._observe_partial if self.speculator else None
+        )
+        log.info("Transcriber initialized for room %s", room_code)
         
-    def _initialize_api(self):
-        """Initialize AssemblyAI API with key from environment variables."""
-        load_dotenv()
-        aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
-        if not aai.settings.api_key:
-            raise ValueError("ASSEMBLYAI_API_KEY not found in environment variables")
-
     async def _send_message(self, message_type: str, text: str, additional_data: dict = None):
         """Helper method to broadcast messages to all room members."""
         try:
@@ -45,12 +108,20 @@ class RealTimeTranscriber:
             # Broadcast to all users in the room
             await self.connection_manager.broadcast_to_room(self.room_code, message)
         except Exception as e:
-            print(f"Error sending message: {e}")
+            log.error("Error sending message: %s", e)
 
-    async def set_user_language(self, user_id: str, language: str):
-        """Set the language preference for a specific user."""
-        print(f"Setting language {language} for user {user_id}")  # Debug log
-        self.user_languages[user_id] = language
+    async def set_user_language(self, user_id: str, language: str, confirm: bool = True):
+        """Set the language preference for a specific user, confirming it to them unless their own node already did."""
+        log.debug("Setting language %s for user %s", language, user_id)
+        previous = self.room_manager.set_language(self.room_code, user_id, language)
+        connection = self.connection_manager.active_connections.get(user_id)
+        if connection:
+            connection.language = language
+        if previous is not None and previous != language:
+            # Translations still pending in the old language are no longer wanted
+            self.scheduler.cancel_user(user_id)
+        if not confirm:
+            return
         # Send confirmation to the user
         try:
             await self.connection_manager.send_to_user(
@@ -61,65 +132,119 @@ class RealTimeTranscriber:
                     "timestamp": datetime.now().isoformat()
                 }
             )
-            print(f"Language confirmation sent to user {user_id}")  # Debug log
         except Exception as e:
-            print(f"Error sending language confirmation: {e}")
+            log.error("Error sending language confirmation: %s", e)
         
-    def _on_data(self, transcript: aai.RealtimeTranscript):
+    def remove_user(self, user_id: str):
+        """Forget a guest who left and cancel translations only they needed."""
+        self.room_manager.set_language(self.room_code, user_id, None)
+        self.scheduler.cancel_user(user_id)
+
+    def _on_data(self, transcript: TranscriptEvent):
         """Callback when transcript data is received."""
         if not transcript.text:
             return
 
-        asyncio.run_coroutine_threadsafe(
-            self._handle_transcript(transcript), 
-            self.loop
-        )
+        now = time.time()
+        if self._stream_started_at is not None:
+            # Measured from the newest chunk streamed, so a service lagging behind shows as the gap
+            STAGES.observe(now - self._stream_started_at, "stream_to_partial" if not transcript.is_final else "stream_to_final")
+        if transcript.is_final:
+            if self._segment_started_at is not None:
+                STAGES.observe(now - self._segment_started_at, "partial_to_final")
+            self._segment_started_at = None
+            transcript.audio_received_at = self._audio_received_at
+        elif self._segment_started_at is None:
+            self._segment_started_at = now
 
-    async def _handle_transcript(self, transcript: aai.RealtimeTranscript):
+        # Partials are coalesced; a final is sent right away and supersedes the pending partial
+        if transcript.is_final:
+            self.partials.offer_final(transcript)
+        else:
+            self.partials.offer(transcript.text)
+
+    async def _handle_final(self, transcript: TranscriptEvent):
         try:
-            if isinstance(transcript, aai.RealtimeFinalTranscript):
-                print(f"Processing final transcript: {transcript.text}")  # Debug log
-                
-                # Send final transcript to all users
-                await self._send_message(
-                    "final",
-                    transcript.text,
-                    {"confidence": transcript.confidence}
-                )
-                
-                # Process translations for each user
-                for user_id, language in self.user_languages.items():
-                    try:
-                        print(f"Translating for user {user_id} to {language}")  # Debug log
-                        translation = await translate(transcript.text, language=language)
-                        
-                        if translation:
-                            print(f"Translation received: {translation}")  # Debug log
-                            await self.connection_manager.send_to_user(
-                                user_id,
-                                {
-                                    "type": "translation",
-                                    "text": translation,
-                                    "original_text": transcript.text,
-                                    "language": language,
-                                    "timestamp": datetime.now().isoformat()
-                                }
-                            )
-                        else:
-                            print(f"No translation received for user {user_id}")  # Debug log
-                    except Exception as e:
-                        print(f"Translation error for user {user_id}: {e}")  # Debug log
-            else:
-                # Handle partial transcript
-                await self._send_message(
-                    "partial",
-                    transcript.text,
-                    {"is_final": False}
-                )
+            event_log.debug("Processing final transcript in room %s: %s", self.room_code, transcript.text)
+            final_at = time.time()
+            timestamp = datetime.fromtimestamp(final_at).isoformat()
+            # Server clock (epoch ms) at each step, so clients can measure glass-to-glass latency
+            timing = {"final": int(final_at * 1000)}
+            if transcript.audio_received_at is not None:
+                timing["audio"] = int(transcript.audio_received_at * 1000)
+                STAGES.observe(final_at - transcript.audio_received_at, "audio_to_final")
+            # Ids continue across host reconnects, so guests can replay from the last one they saw
+            segment_id = self.history.append(self.history_key, transcript.text, transcript.confidence, timestamp)
+            
+            # Send final transcript to all users
+            await self.connection_manager.broadcast_to_room(self.room_code, {
+                "type": "final",
+                "text": transcript.text,
+                "timestamp": timestamp,
+                "confidence": transcript.confidence,
+                "segment_id": segment_id,
+                "timing": timing
+            })
+            
+            # Guests grouped by target language (kept by the room) so each language is translated once
+            language_groups = self.room_manager.language_groups(self.room_code)
+            
+            # Reuse speculative translations of the stable partial when they match
+            speculative = self.speculator.take(transcript.text) if self.speculator else {}
+            runners = {
+                language: self._make_runner(segment_id, transcript.text, language, speculative.get(language))
+                for language in language_groups
+            }
+            await self.scheduler.submit(segment_id, transcript.text, language_groups, runners, timing=timing)
         except Exception as e:
-            print(f"Error in _handle_transcript: {e}")
+            log.exception("Error handling transcript: %s", e)
 
-    def _on_error(self, error: aai.RealtimeError):
+    def _observe_partial(self, text: str):
+        """Let the speculator see each coalesced partial, including repeats that aren't re-broadcast."""
+        self.speculator.observe_partial(text, self.room_manager.language_groups(self.room_code).keys())
+
+    async def _send_partial(self, text: str, fields: dict):
+        """Broadcast one coalesced partial; fields carry the full text or, in diff mode, the changed suffix."""
+        await self._send_message("partial", fields.pop("text"), {"is_final": False, **fields})
+
+    def _make_runner(self, segment_id: int, text: str, language: str, speculative: Optional[asyncio.Task] = None):
+        """Build the scheduler job that translates one final into one language and records the result."""
+        async def translate(on_partial):
+            if speculative is not None:
+                try:
+                    translation = await speculative
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning("Speculative translation failed for language %s: %s", language, e)
+                    translation = None
+                if translation:
+                    return translation
+            
+            if self.stream_translations:
+                translation = None
+                try:
+                    async for translation in get_translation_service().translate_stream(text, language):
+                        await on_partial(translation)
+                    return translation
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # What streamed so far is incomplete; translate the whole segment instead
+                    log.warning("Streaming translation failed for language %s, retrying without streaming: %s", language, e)
+            
+            # Segments arriving close together share one batched request
+            translations = await get_translation_batcher().translate(text, [language])
+            return translations.get(language)
+
+        async def run(on_partial):
+            translation = await translate(on_partial)
+            if translation:
+                self.history.add_translation(self.history_key, segment_id, language, translation)
+            return translation
+        return run
+
+    def _on_error(self, error: str):
         """Callback when an error occurs."""
         asyncio.run_coroutine_threadsafe(
             self._send_message("error", str(error)),
@@ -127,55 +252,118 @@ class RealTimeTranscriber:
         )
 
     def _setup_transcriber(self):
-        """Set up the real-time transcriber with callbacks."""
-        self.transcriber = aai.RealtimeTranscriber(
-            sample_rate=self.sample_rate,
-            on_data=self._on_data,
-            on_error=self._on_error
+        """Set up the transcription backend (TRANSCRIPTION_BACKEND) with callbacks."""
+        self.transcriber: TranscriptionBackend = create_transcription_backend(
+            self.sample_rate,
+            on_transcript=self._on_data,
+            on_error=self._on_error,
+            name=self.backend_name
         )
 
     async def connect(self):
-        """Connect to the AssemblyAI service."""
+        """Connect to the transcription service."""
         try:
-            self.transcriber.connect()
-            # Start the audio processing thread
-            self.process_thread = threading.Thread(target=self._process_audio_queue)
-            self.process_thread.start()
+            self._in_flight = self.loop.run_in_executor(get_audio_executor(), self.transcriber.connect)
+            await self._in_flight
+            # Start streaming queued audio on the event loop
+            self._stream_task = asyncio.create_task(self._stream_audio())
             await self._send_message("status", "Connected to transcription service")
         except Exception as e:
-            print(f"Error connecting to AssemblyAI: {e}")
+            log.error("Error connecting to transcription service: %s", e)
             await self._send_message("error", f"Connection error: {str(e)}")
 
-    def _process_audio_queue(self):
-        """Process audio data from the queue in a separate thread."""
+    async def _stream_audio(self):
+        """Forward queued audio to the transcription service using the shared worker pool."""
+        executor = get_audio_executor()
         while self.is_running:
+            item = await self.audio_queue.get()
+            if item is None:
+                break
+            received_at, audio_data = item
+            started_at = time.time()
+            STAGES.observe(started_at - received_at, "audio_queue")
+            self._audio_received_at = received_at
+            self._stream_started_at = started_at
             try:
-                audio_data = self.audio_queue.get(timeout=1)
-                self.transcriber.stream(audio_data)
-            except queue.Empty:
-                continue
+                self._in_flight = self.loop.run_in_executor(executor, self.transcriber.stream, audio_data)
+                # Shielded so stop() can't orphan a call still running in the pool
+                await asyncio.shield(self._in_flight)
+                STAGES.observe(time.time() - started_at, "audio_stream")
             except Exception as e:
-                print(f"Error processing audio: {e}")
-                asyncio.run_coroutine_threadsafe(
-                    self._send_message("error", f"Processing error: {str(e)}"),
-                    self.loop
-                )
+                event_log.error("Error processing audio in room %s: %s", self.room_code, e)
+                await self._send_message("error", f"Processing error: {str(e)}")
+
+    async def process_audio(self, audio_data: bytes):
+        """Re-frame incoming audio, drop silence and add the remaining frames to the processing queue."""
+        if not self.is_running:
+            return
+        received_at = time.time()
+        frames = self.framer.push(audio_data) if self.framer else [audio_data]
+        for frame in frames:
+            for chunk in self.vad.process(frame):
+                await self._enqueue_audio((received_at, chunk))
+
+    async def _enqueue_audio(self, item: tuple):
+        """
+        Add one (received_at, chunk) pair to the processing queue.
+
+        When the queue is full the host's receive loop waits up to
+        backpressure_timeout for the transcription service to catch up, which
+        slows the socket read. After that the oldest chunk is dropped.
+        """
+        try:
+            self.audio_queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self.audio_queue.put(item), timeout=self.backpressure_timeout)
+        except asyncio.TimeoutError:
+            try:
+                self.audio_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped_chunks += 1
+            self.audio_queue.put_nowait(item)
+            if self.dropped_chunks == 1 or self.dropped_chunks % 100 == 0:
+                log.warning("Transcription falling behind in room %s, dropped %d audio chunks", self.room_code, self.dropped_chunks)
 
-    def process_audio(self, audio_data: bytes):
-        """Add audio data to the processing queue."""
-        if self.is_running:
-            self.audio_queue.put(audio_data)
+    def stats(self) -> dict:
+        """Report audio buffering counters."""
+        return {
+            "queue_depth": self.audio_queue.qsize(),
+            "queue_capacity": self.audio_queue.maxsize,
+            "dropped_chunks": self.dropped_chunks,
+            "framer_buffered_bytes": self.framer.buffered_bytes if self.framer else 0,
+            "framer_dropped_bytes": self.framer.dropped_bytes if self.framer else 0,
+            "vad": self.vad.stats(),
+            "speculation": self.speculator.stats() if self.speculator else None,
+            "partials": self.partials.stats(),
+            "translation_scheduler": self.scheduler.stats()
+        }
 
     def stop(self):
-        """Stop the transcription session."""
+        """Stop the transcription session without blocking the event loop."""
+        if not self.is_running:
+            return
         self.is_running = False
+        if self._stream_task:
+            self._stream_task.cancel()
+        self.partials.close()
+        if self.speculator:
+            self.speculator.reset()
+        self.scheduler.close()
+        self.loop.create_task(self._shutdown())
+
+    async def _shutdown(self):
+        if self._in_flight is not None:
+            # One transcriber call at a time: let the last stream() finish before close()
+            try:
+                await self._in_flight
+            except Exception:
+                pass  # Already reported by whoever started it
         try:
-            self.transcriber.close()
-            if hasattr(self, 'process_thread'):
-                self.process_thread.join()
-            asyncio.run_coroutine_threadsafe(
-                self._send_message("status", "Transcription service disconnected"),
-                self.loop
-            )
+            await self.loop.run_in_executor(get_audio_executor(), self.transcriber.close)
+            await self._send_message("status", "Transcription service disconnected")
         except Exception as e:
-            print(f"Error while closing transcriber: {e}")
\ No newline at end of file
+            log.warning("Error while closing transcriber: %s", e)
@@ -1,19 +1,118 @@
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Set, Union
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple, Union
 from datetime import datetime, timedelta
+import heapq
 import random
 import string
+import time
 
-@dataclass
+if TYPE_CHECKING:
+    from tools.connection_manager import ClientConnection
+
+@dataclass(slots=True)
 class Room:
-    """Data class representing a room in the system."""
+    """
+    Data class representing a room in the system.
+
+    Change guests through add_guest/remove_guest/set_guests so the prebuilt
+    member_ids and recipients stay current; broadcasts iterate those
+    instead of rebuilding the member set for every message. The same
+    methods keep the language index (language to guests) in step.
+    """
     code: str
     host_id: str
     created_at: datetime
     guests: Set[str]
     max_participants: int = 50
     is_active: bool = True
-    user_last_active: Dict[str, datetime] = field(default_factory=dict)
+    # time.monotonic() of each member's last recorded activity
+    user_last_active: Dict[str, float] = field(default_factory=dict)
+    # Records of members connected to this process, by user
+    connections: Dict[str, "ClientConnection"] = field(default_factory=dict, repr=False)
+    member_ids: Tuple[str, ...] = field(default=(), repr=False)
+    recipients: Tuple["ClientConnection", ...] = field(default=(), repr=False)
+    # Translation targets: language to guests, and each guest's language
+    languages: Dict[str, Set[str]] = field(default_factory=dict)
+    member_languages: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self._rebuild()
+
+    def _rebuild(self):
+        self.member_ids = (self.host_id, *self.guests)
+        self.recipients = tuple(self.connections.values())
+
+    def add_guest(self, user_id: str):
+        self.guests.add(user_id)
+        self._rebuild()
+
+    def remove_guest(self, user_id: str):
+        self.guests.discard(user_id)
+        self.connections.pop(user_id, None)
+        self.set_language(user_id, None)
+        self._rebuild()
+
+    def set_guests(self, guests: Set[str]):
+        self.guests = guests
+        for user_id in [user_id for user_id in self.connections if user_id != self.host_id and user_id not in guests]:
+            del self.connections[user_id]
+        for user_id in [user_id for user_id in self.member_languages if user_id not in guests]:
+            self.set_language(user_id, None)
+        self._rebuild()
+
+    def set_language(self, user_id: str, language: Optional[str]) -> Optional[str]:
+        """Move a guest to another language group (None removes them). Returns the previous language."""
+        previous = self.member_languages.get(user_id)
+        if previous == language:
+            return previous
+        if previous is not None:
+            members = self.languages[previous]
+            members.discard(user_id)
+            if not members:
+                del self.languages[previous]
+            del self.member_languages[user_id]
+        if language:
+            self.member_languages[user_id] = language
+            self.languages.setdefault(language, set()).add(user_id)
+        return previous
+
+    def attach(self, connection: "ClientConnection"):
+        """Include a member's local connection in broadcasts."""
+        if connection.user_id == self.host_id or connection.user_id in self.guests:
+            self.connections[connection.user_id] = connection
+            self._rebuild()
+
+    def detach(self, connection: "ClientConnection"):
+        if self.connections.get(connection.user_id) is connection:
+            del self.connections[connection.user_id]
+            self._rebuild()
+
+    def to_dict(self) -> dict:
+        """Membership, languages and status shared with other nodes (activity stays local)."""
+        return {
+            "code": self.code,
+            "host_id": self.host_id,
+            "created_at": self.created_at.isoformat(),
+            "guests": sorted(self.guests),
+            "languages": dict(self.member_languages),
+            "max_participants": self.max_participants,
+            "is_active": self.is_active
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Room":
+        room = cls(
+            code=data["code"],
+            host_id=data["host_id"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            guests=set(data["guests"]),
+            max_participants=data["max_participants"],
+            is_active=data["is_active"]
+        )
+        for user_id, language in data.get("languages", {}).items():
+            if user_id in room.guests:
+                room.set_language(user_id, language)
+        return room
 
 class RoomManager:
     """Manages room creation, joining, and state management."""
@@ -21,6 +120,48 @@ class RoomManager:
     def __init__(self):
         self._rooms: Dict[str, Room] = {}
         self._user_to_room: Dict[str, str] = {}  # Maps user IDs to room codes
+        # Called with a room code whenever that room's membership or status changes
+        self.on_change: Optional[Callable[[str], None]] = None
+        # Returns a connected user's monotonic last-active time; only read during sweeps
+        self.activity_source: Optional[Callable[[str], Optional[float]]] = None
+        # Min-heap of (last active, user, room code) so cleanup only visits expired users.
+        # Activity updates don't touch the heap; an entry found stale is re-pushed instead.
+        self._activity_heap: List[Tuple[float, str, str]] = []
+        self._activity_entries: Dict[str, Tuple[float, str, str]] = {}  # User to their live heap entry
+        # Min-heap of (created at, room code) for deactivated rooms awaiting eviction
+        self._inactive_rooms: List[Tuple[datetime, str]] = []
+        self.sweeps = 0
+        self.last_sweep: Dict[str, float] = {}
+        self.sweep_totals = {"users_removed": 0, "rooms_deactivated": 0, "rooms_evicted": 0}
+
+    def _index_user(self, user_id: str, room_code: str, last_active: float):
+        entry = (last_active, user_id, room_code)
+        self._activity_entries[user_id] = entry
+        heapq.heappush(self._activity_heap, entry)
+
+    def _last_active(self, room: Room, user_id: str) -> float:
+        last_active = room.user_last_active.get(user_id, float("-inf"))
+        if self.activity_source:
+            live = self.activity_source(user_id)
+            if live is not None and live > last_active:
+                return live
+        return last_active
+
+    def _deactivate(self, room: Room) -> int:
+        """Mark a room inactive and release its members. Returns how many were released."""
+        room.is_active = False
+        released = 0
+        for user_id in list(room.guests) + [room.host_id]:
+            self._activity_entries.pop(user_id, None)
+            if self._user_to_room.get(user_id) == room.code:
+                del self._user_to_room[user_id]
+                released += 1
+        heapq.heappush(self._inactive_rooms, (room.created_at, room.code))
+        return released
+
+    def _changed(self, room_code: str):
+        if self.on_change:
+            self.on_change(room_code)
         
     def generate_room_code(self, length: int = 5) -> str:
         """Generate a unique room code."""
@@ -31,39 +172,57 @@ class RoomManager:
             if code not in self._rooms:
                 return code
 
-    def cleanup_inactive_users(self, max_inactive_time: int = 5 * 60):  # 5 minutes
-        """Remove users who have been inactive for too long."""
-        current_time = datetime.now()
-        
-        for room_code, room in list(self._rooms.items()):
-            if not room.is_active:
+    def cleanup_inactive_users(self, max_inactive_time: int = 5 * 60) -> Dict[str, int]:  # 5 minutes
+        """
+        Remove users who have been inactive for too long.
+
+        Only users whose indexed last-active time is past the cutoff are
+        examined; anyone active since then is re-indexed at their new time.
+
+        Returns:
+            dict: Users examined and removed, and rooms deactivated because their host expired
+        """
+        cutoff = time.monotonic() - max_inactive_time
+        examined = users_removed = rooms_deactivated = 0
+        changed = set()
+
+        heap = self._activity_heap
+        while heap and heap[0][0] < cutoff:
+            entry = heapq.heappop(heap)
+            _, user_id, room_code = entry
+            if self._activity_entries.get(user_id) is not entry:
+                continue  # User left or rejoined since this entry was pushed
+            examined += 1
+
+            room = self._rooms.get(room_code)
+            if not room or not room.is_active or self._user_to_room.get(user_id) != room_code:
+                del self._activity_entries[user_id]
                 continue
-            
-            # Check host
-            host_inactive = (
-                room.user_last_active.get(room.host_id, datetime.min) + 
-                timedelta(seconds=max_inactive_time) < current_time
-            )
-            
-            if host_inactive:
-                # If host is inactive, deactivate the entire room
-                room.is_active = False
-                for user in list(room.guests) + [room.host_id]:
-                    if user in self._user_to_room:
-                        del self._user_to_room[user]
+
+            last_active = self._last_active(room, user_id)
+            if last_active >= cutoff:
+                self._index_user(user_id, room_code, last_active)
                 continue
-            
-            # Check guests
-            for guest in list(room.guests):
-                guest_inactive = (
-                    room.user_last_active.get(guest, datetime.min) + 
-                    timedelta(seconds=max_inactive_time) < current_time
-                )
-                
-                if guest_inactive:
-                    room.guests.remove(guest)
-                    if guest in self._user_to_room:
-                        del self._user_to_room[guest]
+
+            if user_id == room.host_id:
+                # If host is inactive, deactivate the entire room
+                users_removed += self._deactivate(room)
+                rooms_deactivated += 1
+            else:
+                room.remove_guest(user_id)
+                room.user_last_active.pop(user_id, None)
+                del self._user_to_room[user_id]
+                del self._activity_entries[user_id]
+                users_removed += 1
+            changed.add(room_code)
+
+        for room_code in changed:
+            self._changed(room_code)
+        return {
+            "users_examined": examined,
+            "users_removed": users_removed,
+            "rooms_deactivated": rooms_deactivated
+        }
     
     def create_room(self, host_id: str, max_participants: int = 50) -> Room:
         """Create a new room with the given host."""
@@ -81,6 +240,9 @@ class RoomManager:
         
         self._rooms[code] = room
         self._user_to_room[host_id] = code
+        # The host counts as active from creation until their socket reports in
+        self._index_user(host_id, code, time.monotonic())
+        self._changed(code)
         return room
     
     def join_room(self, room_code: str, user_id: str) -> Room:
@@ -98,9 +260,11 @@ class RoomManager:
         if len(room.guests) >= room.max_participants:
             raise ValueError("Room is full")
             
-        room.guests.add(user_id)
-        room.user_last_active[user_id] = datetime.now()
+        room.add_guest(user_id)
+        room.user_last_active[user_id] = time.monotonic()
         self._user_to_room[user_id] = room_code
+        self._index_user(user_id, room_code, room.user_last_active[user_id])
+        self._changed(room_code)
         return room
     
     def leave_room(self, user_id: str) -> None:
@@ -112,21 +276,34 @@ class RoomManager:
         room = self._rooms[room_code]
         
         if user_id == room.host_id:
-            # If host leaves, close the room
-            room.is_active = False
-            # Remove all users from the room
-            for guest in room.guests:
-                del self._user_to_room[guest]
-            del self._user_to_room[user_id]
-            # Keep room in _rooms for history but marked as inactive
+            # If host leaves, close the room and remove all users from it.
+            # Keep room in _rooms for history (until evicted) but marked as inactive
+            self._deactivate(room)
         else:
             # Remove guest from room
-            room.guests.remove(user_id)
+            room.remove_guest(user_id)
             del self._user_to_room[user_id]
+            self._activity_entries.pop(user_id, None)
         # Ensure user is removed from _user_to_room
         if user_id in self._user_to_room:
             del self._user_to_room[user_id]
+        self._changed(room_code)
     
+    def set_language(self, room_code: str, user_id: str, language: Optional[str]) -> Optional[str]:
+        """Record a guest's translation language (None clears it). Returns the previous language."""
+        room = self._rooms.get(room_code)
+        if room is None:
+            return None
+        previous = room.set_language(user_id, language)
+        if previous != language:
+            self._changed(room_code)
+        return previous
+
+    def language_groups(self, room_code: str) -> Dict[str, Set[str]]:
+        """Guests by translation language. The sets are live; copy before holding on to them."""
+        room = self._rooms.get(room_code)
+        return room.languages if room else {}
+
     def get_room(self, room_code: str) -> Optional[Room]:
         """Get room information by code."""
         return self._rooms.get(room_code)
@@ -143,16 +320,85 @@ class RoomManager:
         room = self._rooms.get(room_code)
         return room and room.host_id == user_id
     
-    def cleanup_inactive_rooms(self, max_age_hours: int = 24) -> None:
-        """Remove inactive rooms older than max_age_hours."""
+    def cleanup_inactive_rooms(self, max_age_hours: int = 24) -> int:
+        """Remove inactive rooms older than max_age_hours. Returns how many were removed."""
         cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
         
-        # Find rooms to remove
-        to_remove = [
-            code for code, room in self._rooms.items()
-            if not room.is_active and room.created_at < cutoff_time
-        ]
-        
-        # Remove the rooms
-        for code in to_remove:
-            del self._rooms[code]
\ No newline at end of file
+        removed = 0
+        heap = self._inactive_rooms
+        while heap and heap[0][0] < cutoff_time:
+            _, code = heapq.heappop(heap)
+            room = self._rooms.get(code)
+            if room and not room.is_active:
+                del self._rooms[code]
+                removed += 1
+                self._changed(code)
+        return removed
+
+    def sweep(self, max_inactive_time: int = 5 * 60, max_age_hours: int = 24) -> Dict[str, float]:
+        """Expire inactive users, then evict old inactive rooms, recording what was reclaimed."""
+        started = time.perf_counter()
+        result = self.cleanup_inactive_users(max_inactive_time)
+        result["rooms_evicted"] = self.cleanup_inactive_rooms(max_age_hours)
+        result["duration_ms"] = (time.perf_counter() - started) * 1000
+
+        self.sweeps += 1
+        self.last_sweep = result
+        for key in self.sweep_totals:
+            self.sweep_totals[key] += result[key]
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "users": len(self._user_to_room),
+            "indexed_users": len(self._activity_entries),
+            "inactive_rooms_pending": len(self._inactive_rooms),
+            "sweeps": self.sweeps,
+            "last_sweep": self.last_sweep,
+            "totals": self.sweep_totals
+        }
+
+    def apply_snapshot(self, data: dict) -> Room:
+        """Update the local copy of a room with state received from another node."""
+        incoming = Room.from_dict(data)
+        room = self._rooms.get(incoming.code)
+        was_active = room is not None and room.is_active
+        if room is None:
+            room = self._rooms[incoming.code] = incoming
+        else:
+            staying = {incoming.host_id} | incoming.guests if incoming.is_active else set()
+            for user_id in {room.host_id} | room.guests:
+                if self._user_to_room.get(user_id) == room.code:
+                    del self._user_to_room[user_id]
+                    if user_id not in staying:
+                        self._activity_entries.pop(user_id, None)
+            # Update in place so callers holding the room see the change
+            room.set_guests(incoming.guests)
+            if "languages" in data:
+                for user_id in set(room.member_languages) | set(incoming.member_languages):
+                    room.set_language(user_id, incoming.member_languages.get(user_id))
+            room.max_participants = incoming.max_participants
+            room.is_active = incoming.is_active
+
+        if room.is_active:
+            now = time.monotonic()
+            for user_id in {room.host_id} | room.guests:
+                self._user_to_room[user_id] = room.code
+                # Members who joined elsewhere count as active from now on
+                room.user_last_active.setdefault(user_id, now)
+                entry = self._activity_entries.get(user_id)
+                if entry is None or entry[2] != room.code:
+                    self._index_user(user_id, room.code, room.user_last_active[user_id])
+        elif was_active or room is incoming:
+            heapq.heappush(self._inactive_rooms, (room.created_at, room.code))
+        return room
+
+    def discard_room(self, room_code: str) -> None:
+        """Forget a room another node deleted."""
+        room = self._rooms.pop(room_code, None)
+        if room:
+            for user_id in {room.host_id} | room.guests:
+                if self._user_to_room.get(user_id) == room_code:
+                    del self._user_to_room[user_id]
+                    self._activity_entries.pop(user_id, None)
\ No newline at end of file
@@ -0,0 +1,109 @@
+# tools/speculative_translation.py
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+import asyncio
+import os
+import re
+
+_WORD = re.compile(r"[\w']+", re.UNICODE)
+
+def normalize_words(text: str) -> Tuple[str, ...]:
+    """Words of a transcript ignoring case and punctuation, so partials can be compared with finals."""
+    return tuple(match.group().casefold() for match in _WORD.finditer(text))
+
+class SpeculativeTranslator:
+    """
+    Starts translating the stable prefix of partial transcripts before the final arrives.
+
+    A prefix is stable once it has been identical across stability_updates
+    consecutive partials. Each time the stable prefix grows, the previous
+    speculation is cancelled and the longer prefix is translated. When the
+    final lands its translation is reused if it matches the speculated
+    text, otherwise the in-flight work is cancelled.
+    """
+
+    def __init__(
+        self,
+        translate: Callable[[str, str], Awaitable[str]],
+        stability_updates: int = None,
+        min_words: int = None
+    ):
+        """
+        Args:
+            translate (callable): Coroutine function (text, language) -> translation
+            stability_updates (int): Partials a prefix must survive, defaults to SPECULATIVE_STABILITY_UPDATES or 3
+            min_words (int): Shortest prefix worth translating, defaults to SPECULATIVE_MIN_WORDS or 4
+        """
+        self.translate = translate
+        self.stability_updates = stability_updates or int(os.getenv("SPECULATIVE_STABILITY_UPDATES", "3"))
+        self.min_words = min_words or int(os.getenv("SPECULATIVE_MIN_WORDS", "4"))
+        self._history: deque = deque(maxlen=self.stability_updates)
+        self._words: Tuple[str, ...] = ()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.reused = 0
+        self.cancelled = 0
+
+    def observe_partial(self, text: str, languages: Iterable[str]):
+        """Record a partial and start (or restart) speculation if its stable prefix grew."""
+        matches = list(_WORD.finditer(text))
+        self._history.append(tuple(match.group().casefold() for match in matches))
+        if len(self._history) < self.stability_updates:
+            return
+
+        stable = self._common_prefix(list(self._history))
+        if len(stable) < self.min_words or len(stable) <= len(self._words):
+            return
+
+        self._cancel()
+        self._words = stable
+        # Cut the raw text right after the last stable word, so the prefix holds
+        # exactly those words even when punctuation splits a token ("twenty-five")
+        prefix = text[:matches[len(stable) - 1].end()]
+        for language in set(languages):
+            self._tasks[language] = asyncio.create_task(self.translate(prefix, language))
+            self.started += 1
+
+    @staticmethod
+    def _common_prefix(sequences: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+        shortest = min(sequences, key=len)
+        for index, word in enumerate(shortest):
+            if any(sequence[index] != word for sequence in sequences):
+                return shortest[:index]
+        return shortest
+
+    def take(self, final_text: str) -> Dict[str, asyncio.Task]:
+        """
+        Reconcile with a final transcript and reset for the next utterance.
+
+        Returns:
+            dict: Language to in-flight or finished translation task when the
+                final matches the speculated prefix, otherwise empty
+        """
+        tasks = {}
+        if self._tasks and normalize_words(final_text) == self._words:
+            tasks = self._tasks
+            self.reused += len(tasks)
+            self._tasks = {}
+        self.reset()
+        return tasks
+
+    def reset(self):
+        """Cancel in-flight speculation and forget partial history."""
+        self._cancel()
+        self._history.clear()
+        self._words = ()
+
+    def _cancel(self):
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+        self._tasks = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "started": self.started,
+            "reused": self.reused,
+            "cancelled": self.cancelled
+        }
@@ -1,59 +1,213 @@
 # tools/text_translation.py
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 import asyncio
 
+from tools.logging_config import get_logger
+from tools.rate_limiter import TokenBucket
+from tools.translation_cache import TranslationCache
+from tools.translation_providers import (
+    TranslationProvider,
+    create_translation_provider,
+    parse_provider_overrides
+)
+
 load_dotenv()
 
-translation_template = """
-Translate the following text into {language}. Return ONLY the translation, nothing else.
+log = get_logger("translation")
+
+class TranslationService:
+    """Long-lived translation service routing each language to a warm provider."""
+
+    def __init__(
+        self,
+        default_provider: str = None,
+        overrides: Dict[str, str] = None,
+        providers: Dict[str, TranslationProvider] = None,
+        max_concurrency: int = None,
+        cache: Optional[TranslationCache] = None,
+        rate_limiter: Optional[TokenBucket] = None
+    ):
+        """
+        Create every configured provider once.
+
+        Args:
+            default_provider (str): Provider used for most languages, defaults to TRANSLATION_PROVIDER or openai
+            overrides (dict): Language to provider name, defaults to TRANSLATION_PROVIDER_OVERRIDES
+                (e.g. "ja=openai,es=local")
+            providers (dict): Prebuilt providers by name, created on demand when missing
+            max_concurrency (int): Max in-flight requests, defaults to TRANSLATION_MAX_CONCURRENCY or 10
+            cache (TranslationCache): Translation cache, defaults to TranslationCache.from_env()
+            rate_limiter (TokenBucket): Global request rate limit, defaults to TokenBucket.from_env()
+        """
+        self.default_provider = (default_provider or os.getenv("TRANSLATION_PROVIDER", "openai")).lower()
+        self.overrides = overrides if overrides is not None else parse_provider_overrides(
+            os.getenv("TRANSLATION_PROVIDER_OVERRIDES", "")
+        )
+        self.providers: Dict[str, TranslationProvider] = dict(providers or {})
+        for name in {self.default_provider, *self.overrides.values()}:
+            if name not in self.providers:
+                self.providers[name] = create_translation_provider(name)
+
+        self.max_concurrency = max_concurrency or int(os.getenv("TRANSLATION_MAX_CONCURRENCY", "10"))
+        # Caps concurrent requests so a burst of finals can't open unbounded connections
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.cache = cache if cache is not None else TranslationCache.from_env()
+        # Every provider request (cache hits excluded) takes a token
+        self.rate_limiter = rate_limiter or TokenBucket.from_env()
+
+    def provider_for(self, language: str) -> TranslationProvider:
+        """Return the provider configured for a target language."""
+        return self.providers[self.overrides.get(language, self.default_provider)]
+
+    async def translate(self, text: str, language: str) -> str:
+        """
+        Asynchronously translate text with the provider chosen for the language.
+
+        Args:
+            text (str): Text to translate
+            language (str): Target language
+
+        Returns:
+            str: Translated text, or None on failure
+        """
+        cached = self.cache.get(text, language)
+        if cached is not None:
+            return cached
+
+        try:
+            log.debug("Translating text to %s: %s", language, text)
+            await self.rate_limiter.acquire()
+            async with self._semaphore:
+                translation = await self.provider_for(language).translate(text, language)
+            log.debug("Translation result: %s", translation)
+            if translation:
+                self.cache.set(text, language, translation)
+            return translation
+
+        except Exception as e:
+            log.error("Translation error: %s", e)
+            return None
+
+    async def translate_stream(self, text: str, language: str) -> AsyncIterator[str]:
+        """
+        Yield the translation as it grows, one accumulated string per update.
+
+        Cached translations are yielded once. The complete text is cached
+        when the stream finishes. If the provider fails partway the error is
+        re-raised, so callers never mistake a truncated translation for the
+        whole one.
 
-Text to translate: {text}
-"""
+        Args:
+            text (str): Text to translate
+            language (str): Target language
+        """
+        cached = self.cache.get(text, language)
+        if cached is not None:
+            yield cached
+            return
+
+        translation = ""
+        try:
+            await self.rate_limiter.acquire()
+            async with self._semaphore:
+                async for chunk in self.provider_for(language).stream(text, language):
+                    translation += chunk
+                    yield translation
+        except Exception as e:
+            log.error("Streaming translation error: %s", e)
+            raise
+        if translation:
+            self.cache.set(text, language, translation)
+
+    async def translate_batch(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Translate several (text, language) pairs with one request per provider.
+
+        Cached pairs are answered locally and only the misses are sent out.
+        Pairs missing from a provider's reply are retried one by one.
+
+        Args:
+            items (list): (text, language) pairs
+
+        Returns:
+            list: Translations in the same order as items, None for failures
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        by_provider: Dict[str, List[int]] = {}
+        for index, (text, language) in enumerate(items):
+            cached = self.cache.get(text, language)
+            if cached is not None:
+                results[index] = cached
+            else:
+                name = self.overrides.get(language, self.default_provider)
+                by_provider.setdefault(name, []).append(index)
+
+        await asyncio.gather(*(
+            self._translate_provider_batch(self.providers[name], items, indexes, results)
+            for name, indexes in by_provider.items()
+        ))
+        return results
+
+    async def _translate_provider_batch(self, provider: TranslationProvider, items, indexes: List[int], results: List[Optional[str]]):
+        if len(indexes) > 1:
+            try:
+                log.debug("Batch translating %d items with %s", len(indexes), provider.name)
+                await self.rate_limiter.acquire()
+                async with self._semaphore:
+                    translations = await provider.translate_batch([items[index] for index in indexes])
+                for index, translation in zip(indexes, translations):
+                    if translation:
+                        results[index] = translation
+                        self.cache.set(items[index][0], items[index][1], translation)
+            except Exception as e:
+                log.error("Batch translation error: %s", e)
+
+        # Fall back to single requests for anything the batch reply did not cover
+        missing = [index for index in indexes if results[index] is None]
+        if missing:
+            translations = await asyncio.gather(*(self.translate(*items[index]) for index in missing))
+            for index, translation in zip(missing, translations):
+                results[index] = translation
+
+    async def aclose(self):
+        """Close every provider and the cache backend."""
+        for provider in self.providers.values():
+            await provider.aclose()
+        self.cache.close()
+
+_translation_service: Optional[TranslationService] = None
+
+def get_translation_service() -> TranslationService:
+    """Return the process-wide translation service, creating it on first use."""
+    global _translation_service
+    if _translation_service is None:
+        _translation_service = TranslationService()
+    return _translation_service
+
+async def close_translation_service():
+    """Close the process-wide translation service if it was created."""
+    global _translation_service
+    if _translation_service is not None:
+        await _translation_service.aclose()
+        _translation_service = None
 
 async def translate(text: str, language: str) -> str:
     """
-    Asynchronously translate text using OpenAI's API via LangChain.
-    
+    Asynchronously translate text using the shared translation service.
+
     Args:
         text (str): Text to translate
         language (str): Target language
-        
+
     Returns:
         str: Translated text
     """
     try:
-        print(f"Translating text to {language}: {text}")
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-
-        # Initialize LLM
-        llm = ChatOpenAI(
-            temperature=0.0,
-            model="gpt-4-turbo-preview",
-            api_key=api_key
-        )
-        
-        # Create prompt template
-        prompt = ChatPromptTemplate.from_template(translation_template)
-        
-        # Create messages from prompt
-        messages = await prompt.ainvoke({
-            "language": language,
-            "text": text
-        })
-        
-        # Get response from LLM
-        response = await llm.ainvoke(messages)
-        
-        translation = response.content
-        print(f"Translation result: {translation}")
-        return translation
-        
+        service = get_translation_service()
     except Exception as e:
-        print(f"Translation error: {str(e)}")
-        return None
\ No newline at end of file
+        log.error("Translation error: %s", e)
+        return None
+    return await service.translate(text, language)
@@ -0,0 +1,363 @@
+# tools/transcript_history.py
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+from tools.logging_config import get_logger
+
+log = get_logger("history")
+
+def history_key(room) -> str:
+    """Key a room's history by code and creation time, so a later room that reuses the code starts empty."""
+    return f"{room.code}@{room.created_at.isoformat()}"
+
+class TranscriptSegment:
+    """One final transcript and the translations made of it."""
+    __slots__ = ("segment_id", "text", "confidence", "timestamp", "translations")
+
+    def __init__(self, segment_id: int, text: str, confidence: Optional[float], timestamp: str, translations: Dict[str, str] = None):
+        self.segment_id = segment_id
+        self.text = text
+        self.confidence = confidence
+        self.timestamp = timestamp
+        self.translations: Dict[str, str] = translations or {}
+
+    def to_dict(self, language: str = None) -> dict:
+        """Serialize for replay, with every translation or only the one for language."""
+        if language is None:
+            translations = dict(self.translations)
+        else:
+            translations = {language: self.translations[language]} if language in self.translations else {}
+        return {
+            "segment_id": self.segment_id,
+            "text": self.text,
+            "confidence": self.confidence,
+            "timestamp": self.timestamp,
+            "translations": translations
+        }
+
+class SQLiteTranscriptStore:
+    """
+    Append-only local backend for segments that no longer fit in memory.
+
+    Writes are queued and applied in order by one writer thread, which
+    commits everything it drained at once, so callers on the event loop
+    never wait on SQLite. Reads first wait for the queued writes to land.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS segments (
+                room_code TEXT NOT NULL,  -- history_key of the room
+                segment_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                confidence REAL,
+                timestamp TEXT NOT NULL,
+                translations TEXT NOT NULL,
+                PRIMARY KEY (room_code, segment_id)
+            )
+            """
+        )
+        self._conn.commit()
+        # Pending writes as (function, args); None stops the writer
+        self._writes: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="transcript-history-writer", daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                for write in batch:
+                    if write is None:
+                        continue
+                    function, args = write
+                    try:
+                        function(*args)
+                    except Exception as e:
+                        log.error("Error writing transcript history: %s", e)
+                try:
+                    self._conn.commit()
+                except Exception as e:
+                    log.error("Error committing transcript history: %s", e)
+            for _ in batch:
+                self._writes.task_done()
+            if None in batch:
+                return
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        self._writes.join()
+
+    def append(self, room_key: str, segment: TranscriptSegment):
+        """Queue a segment evicted from memory."""
+        # Serialized now, since the segment's translations may still change in memory
+        self._writes.put((self._append, (
+            room_key, segment.segment_id, segment.text, segment.confidence, segment.timestamp, json.dumps(segment.translations)
+        )))
+
+    def _append(self, room_key: str, segment_id: int, text: str, confidence: Optional[float], timestamp: str, translations: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO segments (room_code, segment_id, text, confidence, timestamp, translations) VALUES (?, ?, ?, ?, ?, ?)",
+            (room_key, segment_id, text, confidence, timestamp, translations)
+        )
+
+    def add_translation(self, room_key: str, segment_id: int, language: str, translation: str):
+        """Queue a translation that finished after its segment was spilled. Ignored if the segment isn't stored."""
+        self._writes.put((self._add_translation, (room_key, segment_id, language, translation)))
+
+    def _add_translation(self, room_key: str, segment_id: int, language: str, translation: str):
+        row = self._conn.execute(
+            "SELECT translations FROM segments WHERE room_code = ? AND segment_id = ?",
+            (room_key, segment_id)
+        ).fetchone()
+        if row is None:
+            return
+        translations = json.loads(row[0])
+        translations[language] = translation
+        self._conn.execute(
+            "UPDATE segments SET translations = ? WHERE room_code = ? AND segment_id = ?",
+            (json.dumps(translations), room_key, segment_id)
+        )
+
+    def read(self, room_key: str, after: int, before: int, limit: int) -> List[TranscriptSegment]:
+        """Segments with after < segment_id < before, oldest first."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT segment_id, text, confidence, timestamp, translations FROM segments"
+                " WHERE room_code = ? AND segment_id > ? AND segment_id < ? ORDER BY segment_id LIMIT ?",
+                (room_key, after, before, limit)
+            ).fetchall()
+        return [
+            TranscriptSegment(segment_id, text, confidence, timestamp, json.loads(translations))
+            for segment_id, text, confidence, timestamp, translations in rows
+        ]
+
+    def rooms(self) -> Dict[str, str]:
+        """Every stored room key with the timestamp of its newest segment."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT room_code, MAX(timestamp) FROM segments GROUP BY room_code"
+            ).fetchall()
+        return dict(rows)
+
+    def last_segment_id(self, room_key: str) -> int:
+        """Highest stored segment id for a room, or 0."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(segment_id) FROM segments WHERE room_code = ?", (room_key,)
+            ).fetchone()
+        return row[0] or 0
+
+    def delete_room(self, room_key: str):
+        """Queue the removal of every segment of a room."""
+        self._writes.put((self._delete_room, (room_key,)))
+
+    def _delete_room(self, room_key: str):
+        self._conn.execute("DELETE FROM segments WHERE room_code = ?", (room_key,))
+
+    def close(self):
+        """Commit the queued writes, stop the writer and close the database."""
+        if self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+class _RoomHistory:
+    __slots__ = ("segments", "next_id", "spilled")
+
+    def __init__(self, next_id: int):
+        self.segments: deque = deque()  # TranscriptSegment, consecutive ids, oldest first
+        self.next_id = next_id
+        self.spilled = False  # Whether older segments are in the store
+
+class TranscriptHistory:
+    """
+    Per-room log of finals and their translations for late joiners and reconnects.
+
+    Each room keeps its newest max_segments segments in memory. Older ones
+    are written to the optional store, or dropped without one. Rooms are
+    identified by history_key(room), not the bare code, since codes are
+    reused. Segment ids are allocated here, increase by one per final and
+    survive the host reconnecting, so a client's cursor is the last
+    segment_id it has seen.
+    Replay returns stored translations; it never translates again.
+    """
+
+    def __init__(self, max_segments: int = 200, store: Optional[SQLiteTranscriptStore] = None):
+        """
+        Args:
+            max_segments (int): Segments kept in memory per room
+            store (SQLiteTranscriptStore): Optional backend for segments evicted from memory
+        """
+        self.max_segments = max(1, max_segments)
+        self.store = store
+        self._rooms: Dict[str, _RoomHistory] = {}
+        self.appended = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.replays = 0
+
+    @classmethod
+    def from_env(cls) -> "TranscriptHistory":
+        """Build a history from TRANSCRIPT_HISTORY_SIZE and TRANSCRIPT_HISTORY_PATH."""
+        path = os.getenv("TRANSCRIPT_HISTORY_PATH")
+        return cls(
+            max_segments=int(os.getenv("TRANSCRIPT_HISTORY_SIZE", "200")),
+            store=SQLiteTranscriptStore(path) if path else None
+        )
+
+    def _room(self, room_key: str) -> _RoomHistory:
+        history = self._rooms.get(room_key)
+        if history is None:
+            last = self.store.last_segment_id(room_key) if self.store else 0
+            history = self._rooms[room_key] = _RoomHistory(last + 1)
+            history.spilled = last > 0
+        return history
+
+    def append(self, room_key: str, text: str, confidence: Optional[float], timestamp: str) -> int:
+        """Record a final and return its segment id."""
+        history = self._room(room_key)
+        segment = TranscriptSegment(history.next_id, text, confidence, timestamp)
+        history.next_id += 1
+        history.segments.append(segment)
+        self.appended += 1
+        if len(history.segments) > self.max_segments:
+            oldest = history.segments.popleft()
+            if self.store:
+                self.store.append(room_key, oldest)
+                history.spilled = True
+                self.spilled += 1
+            else:
+                self.dropped += 1
+        return segment.segment_id
+
+    def add_translation(self, room_key: str, segment_id: int, language: str, translation: str):
+        """Attach a finished translation to its segment."""
+        history = self._rooms.get(room_key)
+        if history is None or not translation:
+            return
+        segments = history.segments
+        if segments and segment_id >= segments[0].segment_id:
+            index = segment_id - segments[0].segment_id
+            if index < len(segments):
+                segments[index].translations[language] = translation
+        elif self.store and history.spilled:
+            self.store.add_translation(room_key, segment_id, language, translation)
+
+    def replay(self, room_key: str, after: int = 0, language: str = None, limit: int = 100) -> dict:
+        """
+        Segments newer than a cursor, oldest first.
+
+        Args:
+            room_key (str): history_key of the room to read
+            after (int): Last segment_id the client has; 0 for everything retained
+            language (str): Only include translations into this language
+            limit (int): Maximum segments returned
+
+        Returns:
+            {"segments": [...], "cursor": last segment_id returned (or after),
+             "has_more": bool, "truncated": True if segments after the cursor are no longer retained}
+        """
+        self.replays += 1
+        history = self._rooms.get(room_key)
+        if history is None:
+            return {"segments": [], "cursor": after, "has_more": False, "truncated": False}
+
+        segments = history.segments
+        first_in_memory = segments[0].segment_id if segments else history.next_id
+        limit = max(1, limit)
+        found: List[TranscriptSegment] = []
+        if after + 1 < first_in_memory and self.store and history.spilled:
+            found = self.store.read(room_key, after, first_in_memory, limit)
+        if len(found) < limit and segments:
+            start = max(0, after + 1 - first_in_memory)
+            for index in range(start, min(len(segments), start + limit - len(found))):
+                found.append(segments[index])
+
+        cursor = found[-1].segment_id if found else after
+        return {
+            "segments": [segment.to_dict(language) for segment in found],
+            "cursor": cursor,
+            "has_more": cursor < history.next_id - 1,
+            # The oldest segments after the cursor were dropped (no store) or pruned
+            "truncated": bool(found) and found[0].segment_id > after + 1
+        }
+
+    def prune(self, keep: Callable[[str], bool], stored_max_age: float = 24 * 3600) -> int:
+        """
+        Forget rooms for which keep(room_key) is false. Returns how many.
+
+        Rooms in memory go at once, with their stored segments. Rooms found
+        only in the store (left over from before a restart) go once their
+        newest segment is older than stored_max_age seconds, since a room
+        another node still serves may not be known here yet.
+        """
+        removed = [room_key for room_key in self._rooms if not keep(room_key)]
+        for room_key in removed:
+            del self._rooms[room_key]
+            if self.store:
+                self.store.delete_room(room_key)
+        if self.store:
+            cutoff = (datetime.now() - timedelta(seconds=stored_max_age)).isoformat()
+            for room_key, newest in self.store.rooms().items():
+                if room_key not in self._rooms and newest < cutoff and not keep(room_key):
+                    self.store.delete_room(room_key)
+                    removed.append(room_key)
+        return len(removed)
+
+    def stats(self) -> dict:
+        """Report retained segments and how many were spilled or dropped."""
+        return {
+            "rooms": len(self._rooms),
+            "segments_in_memory": sum(len(history.segments) for history in self._rooms.values()),
+            "max_segments_per_room": self.max_segments,
+            "appended": self.appended,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "replays": self.replays
+        }
+
+    def close(self):
+        """Write the segments still in memory to the store so replay and ids continue after a restart."""
+        if self.store:
+            for room_key, history in self._rooms.items():
+                for segment in history.segments:
+                    self.store.append(room_key, segment)
+            self.store.close()
+
+_history: Optional[TranscriptHistory] = None
+
+def get_transcript_history() -> TranscriptHistory:
+    """Return the process-wide transcript history, creating it on first use."""
+    global _history
+    if _history is None:
+        _history = TranscriptHistory.from_env()
+    return _history
+
+def close_transcript_history():
+    """Close the history's store, if any."""
+    global _history
+    if _history is not None:
+        _history.close()
+        _history = None
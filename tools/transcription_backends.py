@@ -0,0 +1,220 @@
+# tools/transcription_backends.py
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+import json
+import os
+import threading
+
+@dataclass
+class TranscriptEvent:
+    """Backend-neutral partial or final transcript."""
+    text: str
+    is_final: bool
+    confidence: Optional[float] = None
+    # Epoch seconds the newest audio streamed before this event reached the server (set by the transcriber)
+    audio_received_at: Optional[float] = None
+
+class TranscriptionBackend:
+    """
+    Interface RealTimeTranscriber drives for speech-to-text.
+
+    connect, stream and close may block; they are called from the shared
+    audio worker pool, one call at a time per session. Callbacks may be
+    invoked from any thread.
+    """
+
+    def __init__(self, sample_rate: int, on_transcript: Callable[[TranscriptEvent], None], on_error: Callable[[str], None]):
+        self.sample_rate = sample_rate
+        self.on_transcript = on_transcript
+        self.on_error = on_error
+
+    def connect(self):
+        raise NotImplementedError
+
+    def stream(self, audio_data: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+class AssemblyAIBackend(TranscriptionBackend):
+    """Streams audio to AssemblyAI's real-time API."""
+
+    def __init__(self, sample_rate: int, on_transcript, on_error):
+        super().__init__(sample_rate, on_transcript, on_error)
+        import assemblyai as aai
+        self._aai = aai
+        self._initialize_api()
+        self.transcriber = aai.RealtimeTranscriber(
+            sample_rate=sample_rate,
+            on_data=self._on_data,
+            on_error=self._on_error
+        )
+
+    def _initialize_api(self):
+        """Initialize AssemblyAI API with key from environment variables."""
+        load_dotenv()
+        self._aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
+        if not self._aai.settings.api_key:
+            raise ValueError("ASSEMBLYAI_API_KEY not found in environment variables")
+
+    def _on_data(self, transcript):
+        if not transcript.text:
+            return
+        is_final = isinstance(transcript, self._aai.RealtimeFinalTranscript)
+        self.on_transcript(TranscriptEvent(
+            text=transcript.text,
+            is_final=is_final,
+            confidence=transcript.confidence if is_final else None
+        ))
+
+    def _on_error(self, error):
+        self.on_error(str(error))
+
+    def connect(self):
+        self.transcriber.connect()
+
+    def stream(self, audio_data: bytes):
+        self.transcriber.stream(audio_data)
+
+    def close(self):
+        self.transcriber.close()
+
+# Vosk models by path; a model is read-only once loaded, so every session shares one
+_vosk_models: Dict[str, object] = {}
+_vosk_models_lock = threading.Lock()
+
+def _load_vosk_model(vosk, model_path: str):
+    """Return the shared model for a path, loading it on first use (from any worker thread)."""
+    with _vosk_models_lock:
+        model = _vosk_models.get(model_path)
+        if model is None:
+            model = _vosk_models[model_path] = vosk.Model(model_path)
+        return model
+
+class VoskBackend(TranscriptionBackend):
+    """Offline CPU transcription with Vosk (requires the optional vosk package and a model)."""
+
+    def __init__(self, sample_rate: int, on_transcript, on_error, model_path: str = None):
+        super().__init__(sample_rate, on_transcript, on_error)
+        try:
+            import vosk
+        except ImportError as e:
+            raise ValueError("The vosk package is required for TRANSCRIPTION_BACKEND=vosk") from e
+        self._vosk = vosk
+        self.model_path = model_path or os.getenv("VOSK_MODEL_PATH")
+        if not self.model_path:
+            raise ValueError("VOSK_MODEL_PATH not found in environment variables")
+        self.recognizer = None
+        self._last_partial = ""
+
+    def connect(self):
+        # Loading the model is slow, which is why this runs in the worker pool; later sessions reuse it
+        model = _load_vosk_model(self._vosk, self.model_path)
+        self.recognizer = self._vosk.KaldiRecognizer(model, self.sample_rate)
+        self.recognizer.SetWords(True)
+
+    def stream(self, audio_data: bytes):
+        if self.recognizer.AcceptWaveform(audio_data):
+            self._emit_final(self.recognizer.Result())
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial and partial != self._last_partial:
+                self._last_partial = partial
+                self.on_transcript(TranscriptEvent(text=partial, is_final=False))
+
+    def _emit_final(self, result: str):
+        result = json.loads(result)
+        text = result.get("text", "")
+        self._last_partial = ""
+        if not text:
+            return
+        words = result.get("result") or []
+        confidence = sum(word.get("conf", 0.0) for word in words) / len(words) if words else None
+        self.on_transcript(TranscriptEvent(text=text, is_final=True, confidence=confidence))
+
+    def close(self):
+        if self.recognizer is not None:
+            self._emit_final(self.recognizer.FinalResult())
+            self.recognizer = None
+
+DEFAULT_FAKE_SCRIPT = [
+    "Good morning everyone and thank you for joining",
+    "Let's start with a quick review of the agenda",
+    "Next slide please",
+    "Our first topic is the quarterly roadmap",
+    "Are there any questions before we continue"
+]
+
+class FakeTranscriptionBackend(TranscriptionBackend):
+    """
+    Deterministic scripted transcription for load testing without network.
+
+    Events are driven by how much audio has been streamed rather than wall
+    clock time: every word_ms of audio adds a word to the current partial.
+    Once an utterance is complete the partial repeats for pause_ms and
+    then a final is emitted. The script cycles forever.
+    """
+
+    def __init__(self, sample_rate: int, on_transcript, on_error, script: List[str] = None, word_ms: int = None, pause_ms: int = None):
+        super().__init__(sample_rate, on_transcript, on_error)
+        if script is None:
+            path = os.getenv("FAKE_TRANSCRIPT_SCRIPT")
+            if path:
+                with open(path) as f:
+                    script = [line.strip() for line in f if line.strip()]
+        self.script = [line.split() for line in (script or DEFAULT_FAKE_SCRIPT)]
+        self.word_ms = word_ms or int(os.getenv("FAKE_TRANSCRIPT_WORD_MS", "300"))
+        self.pause_ms = pause_ms if pause_ms is not None else int(os.getenv("FAKE_TRANSCRIPT_PAUSE_MS", "600"))
+        self._bytes_per_ms = sample_rate * 2 / 1000
+        self._audio_ms = 0.0
+        self._next_event_ms = self.word_ms
+        self._utterance = 0
+        self._words = 0
+        self._repeats = 0
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+
+    def stream(self, audio_data: bytes):
+        if not self.connected:
+            raise RuntimeError("Fake transcription backend is not connected")
+        self._audio_ms += len(audio_data) / self._bytes_per_ms
+        while self._audio_ms >= self._next_event_ms:
+            self._advance()
+
+    def _advance(self):
+        words = self.script[self._utterance % len(self.script)]
+        if self._words < len(words):
+            self._words += 1
+            self.on_transcript(TranscriptEvent(text=" ".join(words[:self._words]), is_final=False))
+            if self._words == len(words):
+                # Like a live service, keep repeating the partial while the speaker pauses
+                self._repeats = self.pause_ms // self.word_ms
+        elif self._repeats > 0:
+            self._repeats -= 1
+            self.on_transcript(TranscriptEvent(text=" ".join(words), is_final=False))
+        else:
+            text = " ".join(words)
+            self.on_transcript(TranscriptEvent(text=text[0].upper() + text[1:] + ".", is_final=True, confidence=1.0))
+            self._utterance += 1
+            self._words = 0
+        self._next_event_ms += self.word_ms
+
+    def close(self):
+        self.connected = False
+
+BACKENDS = {
+    "assemblyai": AssemblyAIBackend,
+    "vosk": VoskBackend,
+    "fake": FakeTranscriptionBackend
+}
+
+def create_transcription_backend(sample_rate: int, on_transcript, on_error, name: str = None) -> TranscriptionBackend:
+    """Create the backend named by name or TRANSCRIPTION_BACKEND (default assemblyai)."""
+    name = (name or os.getenv("TRANSCRIPTION_BACKEND", "assemblyai")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+    return BACKENDS[name](sample_rate, on_transcript, on_error)
@@ -0,0 +1,105 @@
+# tools/translation_batcher.py
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import os
+
+from tools.logging_config import get_logger
+from tools.text_translation import get_translation_service
+
+log = get_logger("translation.batcher")
+
+class TranslationBatcher:
+    """Collects final transcripts over a short window and translates them in one request."""
+
+    def __init__(self, window_ms: float = None, max_segments: int = None):
+        """
+        Args:
+            window_ms (float): How long to collect segments before flushing,
+                defaults to TRANSLATION_BATCH_WINDOW_MS or 150 (0 flushes immediately)
+            max_segments (int): Flush early once this many segments are pending,
+                defaults to TRANSLATION_BATCH_MAX_SEGMENTS or 8
+        """
+        if window_ms is None:
+            window_ms = float(os.getenv("TRANSLATION_BATCH_WINDOW_MS", "150"))
+        self.window = window_ms / 1000
+        self.max_segments = max_segments or int(os.getenv("TRANSLATION_BATCH_MAX_SEGMENTS", "8"))
+        self._pending: List[Tuple[str, List[str], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.requests_sent = 0
+        self.segments_batched = 0
+
+    async def translate(self, text: str, languages: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Queue a segment and wait for its translations.
+
+        Args:
+            text (str): Final transcript text
+            languages (iterable): Target languages needed for this segment
+
+        Returns:
+            dict: Language to translation (None when a translation failed)
+        """
+        languages = list(languages)
+        if not languages:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, languages, future))
+
+        if len(self._pending) >= self.max_segments or self.window <= 0:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything collected so far as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, List[str], asyncio.Future]]):
+        # Identical (text, language) pairs across segments are translated once
+        items = list(dict.fromkeys(
+            (text, language) for text, languages, _ in batch for language in languages
+        ))
+        try:
+            translations = await get_translation_service().translate_batch(items)
+        except Exception as e:
+            log.error("Batch translation failed: %s", e)
+            translations = [None] * len(items)
+
+        self.requests_sent += 1
+        self.segments_batched += len(batch)
+        results = dict(zip(items, translations))
+        for text, languages, future in batch:
+            if not future.done():
+                future.set_result({language: results.get((text, language)) for language in languages})
+
+    def stats(self) -> Dict[str, float]:
+        """Return batching counters."""
+        return {
+            "pending_segments": len(self._pending),
+            "batches": self.requests_sent,
+            "segments": self.segments_batched,
+            "segments_per_batch": self.segments_batched / self.requests_sent if self.requests_sent else 0.0
+        }
+
+_translation_batcher: Optional[TranslationBatcher] = None
+
+def get_translation_batcher() -> TranslationBatcher:
+    """Return the process-wide translation batcher, shared by all rooms."""
+    global _translation_batcher
+    if _translation_batcher is None:
+        _translation_batcher = TranslationBatcher()
+    return _translation_batcher
@@ -0,0 +1,174 @@
+# tools/translation_cache.py
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookups (case and whitespace insensitive)."""
+    return " ".join(text.split()).casefold()
+
+class SQLiteTranslationStore:
+    """Persistent local backend so cached translations survive restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                language TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (text, language)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, text: str, language: str) -> Optional[Tuple[str, float]]:
+        """Return (translation, created_at) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translation, created_at FROM translations WHERE text = ? AND language = ?",
+                (text, language)
+            ).fetchone()
+        return row
+
+    def set(self, text: str, language: str, translation: str, created_at: float):
+        """Insert or replace a translation."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (text, language, translation, created_at) VALUES (?, ?, ?, ?)",
+                (text, language, translation, created_at)
+            )
+            self._conn.commit()
+
+    def delete(self, text: str, language: str):
+        """Remove a translation."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM translations WHERE text = ? AND language = ?",
+                (text, language)
+            )
+            self._conn.commit()
+
+    def purge_expired(self, cutoff: float) -> int:
+        """Remove every entry created before cutoff and return how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM translations WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class TranslationCache:
+    """In-memory LRU cache with TTL expiry and an optional persistent backend."""
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 24 * 60 * 60, store: Optional[SQLiteTranslationStore] = None):
+        """
+        Args:
+            max_size (int): Maximum number of entries kept in memory
+            ttl (float): Seconds an entry stays valid (0 disables expiry)
+            store (SQLiteTranslationStore): Optional persistent backend
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.store_hits = 0
+
+        if self.store and self.ttl:
+            self.store.purge_expired(time.time() - self.ttl)
+
+    @classmethod
+    def from_env(cls) -> "TranslationCache":
+        """Build a cache from TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL and TRANSLATION_CACHE_PATH."""
+        path = os.getenv("TRANSLATION_CACHE_PATH")
+        return cls(
+            max_size=int(os.getenv("TRANSLATION_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("TRANSLATION_CACHE_TTL", str(24 * 60 * 60))),
+            store=SQLiteTranslationStore(path) if path else None
+        )
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def get(self, text: str, language: str) -> Optional[str]:
+        """Return a cached translation or None, updating hit/miss counters."""
+        key = (normalize_text(text), language)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            translation, created_at = entry
+            if not self._expired(created_at, now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return translation
+            del self._entries[key]
+            self.expirations += 1
+
+        if self.store:
+            row = self.store.get(*key)
+            if row is not None:
+                translation, created_at = row
+                if not self._expired(created_at, now):
+                    self._put(key, translation, created_at)
+                    self.hits += 1
+                    self.store_hits += 1
+                    return translation
+                self.store.delete(*key)
+                self.expirations += 1
+
+        self.misses += 1
+        return None
+
+    def set(self, text: str, language: str, translation: str):
+        """Store a translation in memory and in the persistent backend."""
+        key = (normalize_text(text), language)
+        created_at = time.time()
+        self._put(key, translation, created_at)
+        if self.store:
+            self.store.set(key[0], key[1], translation, created_at)
+
+    def _put(self, key: Tuple[str, str], translation: str, created_at: float):
+        self._entries[key] = (translation, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all in-memory entries."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return counters used to size the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "store_hits": self.store_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        if self.store:
+            self.store.close()
@@ -0,0 +1,224 @@
+# tools/translation_providers.py
+from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+import asyncio
+import json
+import os
+
+translation_template = """
+Translate the following text into {language}. Return ONLY the translation, nothing else.
+
+Text to translate: {text}
+"""
+
+batch_translation_template = """
+Translate each item of the following JSON array into the language given by its "language" field.
+Respond with a JSON object of the form {{"translations": [{{"id": <id>, "translation": "<text>"}}]}}
+containing one entry per input item. Return ONLY the JSON object, nothing else.
+
+Items: {items}
+"""
+
+class TranslationProvider:
+    """Interface implemented by every translation engine."""
+
+    name = "base"
+
+    async def translate(self, text: str, language: str) -> str:
+        raise NotImplementedError
+
+    async def translate_batch(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Translate (text, language) pairs; providers without a batch API translate concurrently."""
+        return list(await asyncio.gather(*(self.translate(text, language) for text, language in items)))
+
+    async def stream(self, text: str, language: str) -> AsyncIterator[str]:
+        """Yield the translation in pieces as they are produced; non-streaming providers yield it whole."""
+        yield await self.translate(text, language)
+
+    async def aclose(self):
+        pass
+
+class OpenAIProvider(TranslationProvider):
+    """Translation through an OpenAI chat model with a warm, bounded connection pool."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = None,
+        timeout: float = None,
+        max_connections: int = None,
+        max_retries: int = 2
+    ):
+        """
+        Args:
+            api_key (str): OpenAI API key, defaults to OPENAI_API_KEY
+            model (str): Chat model, defaults to OPENAI_TRANSLATION_MODEL or gpt-4-turbo-preview
+            timeout (float): Request timeout in seconds, defaults to TRANSLATION_TIMEOUT or 15
+            max_connections (int): HTTP pool size, defaults to TRANSLATION_MAX_CONNECTIONS or 20
+            max_retries (int): Retries performed by the OpenAI client
+        """
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+        self.timeout = timeout or float(os.getenv("TRANSLATION_TIMEOUT", "15"))
+        self.max_connections = max_connections or int(os.getenv("TRANSLATION_MAX_CONNECTIONS", "20"))
+
+        # Shared HTTP client so connections (and TLS sessions) are reused across calls
+        self._http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+
+        self.llm = ChatOpenAI(
+            temperature=0.0,
+            model=model or os.getenv("OPENAI_TRANSLATION_MODEL", "gpt-4-turbo-preview"),
+            api_key=api_key,
+            timeout=self.timeout,
+            max_retries=max_retries,
+            http_async_client=self._http_client
+        )
+        self.prompt = ChatPromptTemplate.from_template(translation_template)
+        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.batch_prompt = ChatPromptTemplate.from_template(batch_translation_template)
+        self.batch_chain = (
+            self.batch_prompt
+            | self.llm.bind(response_format={"type": "json_object"})
+            | StrOutputParser()
+        )
+
+    async def translate(self, text: str, language: str) -> str:
+        return await self.chain.ainvoke({
+            "language": language,
+            "text": text
+        })
+
+    async def stream(self, text: str, language: str) -> AsyncIterator[str]:
+        """Yield translation tokens as the model streams them."""
+        async for chunk in self.chain.astream({
+            "language": language,
+            "text": text
+        }):
+            if chunk:
+                yield chunk
+
+    async def translate_batch(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Translate every pair with one structured JSON-mode request."""
+        if len(items) == 1:
+            return [await self.translate(*items[0])]
+
+        payload = json.dumps(
+            [{"id": index, "language": language, "text": text} for index, (text, language) in enumerate(items)],
+            ensure_ascii=False
+        )
+        response = await self.batch_chain.ainvoke({"items": payload})
+
+        results: List[Optional[str]] = [None] * len(items)
+        for entry in json.loads(response).get("translations", []):
+            index = entry.get("id")
+            if isinstance(index, int) and 0 <= index < len(items) and entry.get("translation"):
+                results[index] = entry["translation"]
+        return results
+
+    async def aclose(self):
+        await self._http_client.aclose()
+
+def _local_translate(text: str, source: str, target: str) -> str:
+    """Run in a worker process; argostranslate keeps loaded models per process."""
+    import argostranslate.translate
+    return argostranslate.translate.translate(text, source, target)
+
+class LocalMTProvider(TranslationProvider):
+    """Offline CPU machine translation (argostranslate) running in a process pool."""
+
+    name = "local"
+
+    def __init__(self, source_language: str = None, workers: int = None):
+        """
+        Args:
+            source_language (str): Language of the transcripts, defaults to LOCAL_MT_SOURCE_LANGUAGE or en
+            workers (int): Worker processes, defaults to LOCAL_MT_WORKERS or 2
+        """
+        try:
+            import argostranslate.translate  # noqa: F401
+        except ImportError as e:
+            raise ValueError("The argostranslate package is required for the local translation provider") from e
+        self.source_language = source_language or os.getenv("LOCAL_MT_SOURCE_LANGUAGE", "en")
+        self._executor = ProcessPoolExecutor(max_workers=workers or int(os.getenv("LOCAL_MT_WORKERS", "2")))
+
+    async def translate(self, text: str, language: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _local_translate, text, self.source_language, language)
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class FakeTranslationProvider(TranslationProvider):
+    """Deterministic translation with configurable latency, for benchmarks and offline runs."""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = None, batch_latency_ms: float = None):
+        """
+        Args:
+            latency_ms (float): Delay per request, defaults to FAKE_TRANSLATION_LATENCY_MS or 50
+            batch_latency_ms (float): Extra delay per additional batch item,
+                defaults to FAKE_TRANSLATION_BATCH_LATENCY_MS or 5
+        """
+        self.latency = (latency_ms if latency_ms is not None else float(os.getenv("FAKE_TRANSLATION_LATENCY_MS", "50"))) / 1000
+        self.batch_latency = (batch_latency_ms if batch_latency_ms is not None else float(os.getenv("FAKE_TRANSLATION_BATCH_LATENCY_MS", "5"))) / 1000
+        self.requests = 0
+
+    @staticmethod
+    def render(text: str, language: str) -> str:
+        return f"[{language}] {text}"
+
+    async def translate(self, text: str, language: str) -> str:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return self.render(text, language)
+
+    async def translate_batch(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        self.requests += 1
+        await asyncio.sleep(self.latency + self.batch_latency * (len(items) - 1))
+        return [self.render(text, language) for text, language in items]
+
+    async def stream(self, text: str, language: str) -> AsyncIterator[str]:
+        """Yield the rendered translation word by word, spreading the latency across words."""
+        self.requests += 1
+        words = self.render(text, language).split(" ")
+        delay = self.latency / len(words)
+        for index, word in enumerate(words):
+            await asyncio.sleep(delay)
+            yield word if index == 0 else " " + word
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "local": LocalMTProvider,
+    "fake": FakeTranslationProvider
+}
+
+def parse_provider_overrides(value: str) -> Dict[str, str]:
+    """Parse "ja=openai,es=local" into a language to provider mapping."""
+    overrides = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            language, provider = item.split("=", 1)
+            overrides[language.strip()] = provider.strip().lower()
+    return overrides
+
+def create_translation_provider(name: str) -> TranslationProvider:
+    """Create a provider by name."""
+    name = name.lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown translation provider: {name}")
+    return PROVIDERS[name]()
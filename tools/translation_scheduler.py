@@ -0,0 +1,222 @@
+# tools/translation_scheduler.py
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import heapq
+import os
+import time
+
+from tools.logging_config import get_logger
+from tools.metrics import STAGES
+
+log = get_logger("translation.scheduler")
+
+# A job runner receives an async on_partial(text) callback and returns the translation
+JobRunner = Callable[[Callable[[str], Awaitable[None]]], Awaitable[Optional[str]]]
+
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+DROPPED = "dropped"
+
+class _TranslationJob:
+    """Translation of one segment into one language for a set of guests."""
+    __slots__ = ("seq", "text", "language", "users", "run", "task", "result", "state", "timing", "submitted_at")
+
+    def __init__(self, seq: int, text: str, language: str, users: set, run: JobRunner, timing: Optional[dict] = None):
+        self.seq = seq
+        self.text = text
+        self.language = language
+        self.users = users
+        self.run = run
+        self.task: Optional[asyncio.Task] = None
+        self.result: Optional[str] = None
+        self.state = WAITING
+        self.timing = timing  # Server epoch-ms timestamps of the segment, passed on to guests
+        self.submitted_at = time.time()
+
+class RoomTranslationScheduler:
+    """
+    Runs a room's translation jobs with bounded concurrency.
+
+    Waiting jobs start newest segment first, so a backlog never delays the
+    live conversation, and the oldest waiting jobs are dropped once more
+    than max_pending are queued. Each guest still receives translations in
+    transcript order: a finished job is held until every earlier segment
+    for that guest has been delivered or dropped. Jobs whose guests all
+    leave (or change language) are cancelled.
+    """
+
+    def __init__(self, connection_manager, max_concurrency: int = None, max_pending: int = None):
+        """
+        Args:
+            connection_manager: Used to send translations to guests
+            max_concurrency (int): Jobs running at once, defaults to TRANSLATION_ROOM_CONCURRENCY or 4
+            max_pending (int): Waiting jobs kept before the oldest are dropped,
+                defaults to TRANSLATION_ROOM_MAX_PENDING or 32
+        """
+        self.connection_manager = connection_manager
+        self.max_concurrency = max_concurrency or int(os.getenv("TRANSLATION_ROOM_CONCURRENCY", "4"))
+        self.max_pending = max_pending or int(os.getenv("TRANSLATION_ROOM_MAX_PENDING", "32"))
+        self._waiting: List[tuple] = []  # Heap of (-seq, language, job)
+        self._waiting_count = 0
+        self._running: set = set()
+        self._deliveries: Dict[str, deque] = {}  # User to jobs in transcript order
+        self.submitted = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.cancelled = 0
+
+    async def submit(self, segment_id: int, text: str, language_groups: Dict[str, Iterable[str]], runners: Dict[str, JobRunner], timing: dict = None):
+        """Queue one job per language for a final transcript; timing is copied onto its translations."""
+        for language, user_ids in language_groups.items():
+            job = _TranslationJob(segment_id, text, language, set(user_ids), runners[language], timing)
+            for user_id in job.users:
+                self._deliveries.setdefault(user_id, deque()).append(job)
+            heapq.heappush(self._waiting, (-segment_id, language, job))
+            self._waiting_count += 1
+            self.submitted += 1
+
+        await self._shed_backlog()
+        self._pump()
+
+    async def _shed_backlog(self):
+        """Drop the oldest waiting jobs beyond max_pending."""
+        excess = self._waiting_count - self.max_pending
+        if excess <= 0:
+            return
+        waiting = sorted(
+            (job for _, _, job in self._waiting if job.state == WAITING),
+            key=lambda job: job.seq
+        )
+        affected = set()
+        for job in waiting[:excess]:
+            job.state = DROPPED
+            self._waiting_count -= 1
+            self.dropped += 1
+            affected |= job.users
+        log.warning("Translation backlog too long, dropped %d jobs", min(excess, len(waiting)))
+        await self._deliver(affected)
+
+    def _pump(self):
+        """Start the newest waiting jobs while there is capacity."""
+        while self._waiting and len(self._running) < self.max_concurrency:
+            _, _, job = heapq.heappop(self._waiting)
+            if job.state != WAITING:
+                continue
+            self._waiting_count -= 1
+            job.state = RUNNING
+            STAGES.observe(time.time() - job.submitted_at, "translation_start")
+            self._running.add(job)
+            job.task = asyncio.create_task(self._run(job))
+            job.task.add_done_callback(lambda task, job=job: self._release(job))
+
+    def _release(self, job: _TranslationJob):
+        """
+        Free the slot of a job whose task ended without running _run.
+
+        A task cancelled before its first step never enters _run, so its
+        finally can't do this. Only jobs nobody is waiting for are
+        cancelled, so there is nothing to deliver.
+        """
+        if job in self._running:
+            job.state = DONE
+            job.result = None
+            self._running.discard(job)
+            self._pump()
+
+    async def _run(self, job: _TranslationJob):
+        try:
+            job.result = await job.run(lambda text: self._send_partial(job, text))
+        except asyncio.CancelledError:
+            job.result = None
+        except Exception as e:
+            log.error("Translation job failed for language %s: %s", job.language, e)
+            job.result = None
+        finally:
+            job.state = DONE
+            self._running.discard(job)
+        await self._deliver(job.users)
+        self._pump()
+
+    def _is_next_for(self, user_id: str, job: _TranslationJob) -> bool:
+        queue = self._deliveries.get(user_id)
+        return bool(queue) and queue[0] is job
+
+    async def _send_partial(self, job: _TranslationJob, text: str):
+        """Stream partial translations only to guests for whom this is the next segment."""
+        ready = [user_id for user_id in job.users if self._is_next_for(user_id, job)]
+        if ready:
+            await self.connection_manager.send_to_users(ready, {
+                "type": "translation_partial",
+                "text": text,
+                "original_text": job.text,
+                "language": job.language,
+                "segment_id": job.seq
+            })
+
+    async def _deliver(self, user_ids: Iterable[str]):
+        """Send every finished job that is now at the head of a guest's queue."""
+        ready: Dict[_TranslationJob, List[str]] = {}
+        for user_id in list(user_ids):
+            queue = self._deliveries.get(user_id)
+            while queue and queue[0].state in (DONE, DROPPED):
+                job = queue.popleft()
+                if job.state == DONE and job.result and user_id in job.users:
+                    ready.setdefault(job, []).append(user_id)
+            if queue is not None and not queue:
+                del self._deliveries[user_id]
+
+        for job, recipients in sorted(ready.items(), key=lambda item: item[0].seq):
+            self.delivered += len(recipients)
+            now = time.time()
+            # Includes time held back behind earlier segments for the same guests
+            STAGES.observe(now - job.submitted_at, "translation_finish")
+            message = {
+                "type": "translation",
+                "text": job.result,
+                "original_text": job.text,
+                "language": job.language,
+                "segment_id": job.seq,
+                "timestamp": datetime.fromtimestamp(now).isoformat()
+            }
+            if job.timing is not None:
+                message["timing"] = {**job.timing, "translated": int(now * 1000)}
+                if "audio" in job.timing:
+                    STAGES.observe(now - job.timing["audio"] / 1000, "audio_to_translation")
+            await self.connection_manager.send_to_users(recipients, message)
+
+    def cancel_user(self, user_id: str):
+        """Forget a guest's pending translations, cancelling jobs nobody else needs."""
+        queue = self._deliveries.pop(user_id, None)
+        for job in queue or ():
+            job.users.discard(user_id)
+            if job.users:
+                continue
+            if job.state == WAITING:
+                job.state = DROPPED
+                self._waiting_count -= 1
+                self.cancelled += 1
+            elif job.state == RUNNING and job.task:
+                job.task.cancel()
+                self.cancelled += 1
+
+    def close(self):
+        """Cancel everything."""
+        for job in list(self._running):
+            if job.task:
+                job.task.cancel()
+        self._waiting.clear()
+        self._waiting_count = 0
+        self._deliveries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "waiting": self._waiting_count,
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled
+        }
@@ -0,0 +1,142 @@
+# tools/voice_activity.py
+from collections import deque
+from typing import Dict, List
+import os
+import numpy as np
+
+class VoiceActivityDetector:
+    """Energy and zero-crossing voice activity detection over 16-bit PCM frames."""
+
+    MODES = ("off", "drop", "thin")
+
+    def __init__(
+        self,
+        sample_rate: int = 16_000,
+        mode: str = "drop",
+        energy_threshold: float = 500.0,
+        zcr_threshold: float = 0.25,
+        window_ms: int = 10,
+        hangover_ms: int = 400,
+        padding_ms: int = 200,
+        thin_ratio: int = 5,
+        noise_adaptation: float = 0.05
+    ):
+        """
+        Args:
+            sample_rate (int): Samples per second
+            mode (str): "drop" removes silent frames, "thin" forwards one in
+                thin_ratio so the service still sees some silence, "off" forwards everything
+            energy_threshold (float): Minimum RMS (Int16 scale) counted as speech
+            zcr_threshold (float): Zero-crossing rate below which quieter windows still count as voiced
+            window_ms (int): Analysis window inside each frame
+            hangover_ms (int): Audio still forwarded after speech stops so word endings survive
+            padding_ms (int): Silent audio kept and sent ahead of speech so word onsets survive
+            thin_ratio (int): In "thin" mode, forward every Nth silent frame
+            noise_adaptation (float): Rate at which the noise floor tracks silent frames
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown VAD mode: {mode}")
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = zcr_threshold
+        self.window = max(1, sample_rate * window_ms // 1000)
+        self.hangover_ms = hangover_ms
+        self.padding_ms = padding_ms
+        self.thin_ratio = max(1, thin_ratio)
+        self.noise_adaptation = noise_adaptation
+        self.noise_floor = energy_threshold / 3
+
+        self._padding: deque = deque()
+        self._padding_ms = 0.0
+        self._hangover_left = 0.0
+        self._silent_frames = 0
+
+        self.total_bytes = 0
+        self.forwarded_bytes = 0
+
+    @classmethod
+    def from_env(cls, sample_rate: int = 16_000) -> "VoiceActivityDetector":
+        """Build a detector from the AUDIO_VAD_* environment variables."""
+        return cls(
+            sample_rate=sample_rate,
+            mode=os.getenv("AUDIO_VAD_MODE", "off"),
+            energy_threshold=float(os.getenv("AUDIO_VAD_THRESHOLD", "500")),
+            hangover_ms=int(os.getenv("AUDIO_VAD_HANGOVER_MS", "400")),
+            padding_ms=int(os.getenv("AUDIO_VAD_PADDING_MS", "200")),
+            thin_ratio=int(os.getenv("AUDIO_VAD_THIN_RATIO", "5"))
+        )
+
+    def is_speech(self, frame: bytes) -> bool:
+        """Classify a frame by analysing fixed windows in one vectorized pass."""
+        samples = np.frombuffer(frame, dtype=np.int16, count=len(frame) // 2)
+        windows = len(samples) // self.window
+        if windows == 0:
+            return False
+        block = samples[:windows * self.window].reshape(windows, self.window).astype(np.float32)
+
+        rms = np.sqrt(np.mean(block * block, axis=1))
+        signs = np.signbit(block)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.window - 1)
+
+        threshold = max(self.energy_threshold, self.noise_floor * 3)
+        loud = rms >= threshold
+        # Quieter windows still count when their low zero-crossing rate looks voiced
+        voiced = (rms >= threshold / 2) & (zcr <= self.zcr_threshold)
+        speech = bool(np.any(loud | voiced))
+
+        if not speech:
+            level = float(np.mean(rms))
+            self.noise_floor += self.noise_adaptation * (level - self.noise_floor)
+        return speech
+
+    def process(self, frame: bytes) -> List[bytes]:
+        """Return the frames to forward (possibly none, or buffered padding plus this frame)."""
+        self.total_bytes += len(frame)
+        if self.mode == "off":
+            self.forwarded_bytes += len(frame)
+            return [frame]
+
+        frame_ms = len(frame) / 2 / self.sample_rate * 1000
+
+        if self.is_speech(frame):
+            out = list(self._padding)
+            out.append(frame)
+            self._padding.clear()
+            self._padding_ms = 0.0
+            self._hangover_left = self.hangover_ms
+            self._silent_frames = 0
+        elif self._hangover_left > 0:
+            self._hangover_left -= frame_ms
+            out = [frame]
+        else:
+            self._silent_frames += 1
+            if self.mode == "thin" and self._silent_frames % self.thin_ratio == 0:
+                out = [frame]
+            else:
+                self._remember(frame, frame_ms)
+                return []
+
+        self.forwarded_bytes += sum(len(chunk) for chunk in out)
+        return out
+
+    def _remember(self, frame: bytes, frame_ms: float):
+        """Keep the most recent padding_ms of silence to prepend to the next speech."""
+        if self.padding_ms <= 0:
+            return
+        self._padding.append(frame)
+        self._padding_ms += frame_ms
+        while self._padding and self._padding_ms - len(self._padding[0]) / 2 / self.sample_rate * 1000 >= self.padding_ms:
+            oldest = self._padding.popleft()
+            self._padding_ms -= len(oldest) / 2 / self.sample_rate * 1000
+
+    def stats(self) -> Dict[str, float]:
+        """Report how much audio was suppressed."""
+        suppressed = self.total_bytes - self.forwarded_bytes
+        bytes_per_ms = self.sample_rate * 2 / 1000
+        return {
+            "mode": self.mode,
+            "total_ms": self.total_bytes / bytes_per_ms,
+            "suppressed_ms": suppressed / bytes_per_ms,
+            "suppressed_ratio": suppressed / self.total_bytes if self.total_bytes else 0.0
+        }
@@ -0,0 +1,158 @@
+# tools/wire_protocol.py
+from datetime import datetime
+from typing import Iterable, Optional, Tuple, Union
+from fastapi import WebSocket, WebSocketDisconnect
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# WebSocket subprotocols a client may offer; clients that offer none get JSON
+SUBPROTOCOLS = {
+    "echo.msgpack.v1": MSGPACK,
+    "echo.json.v1": JSON
+}
+
+# Compact encoding tables. Tags are list positions, so only ever append;
+# static/wire-protocol.js carries the same lists.
+MESSAGE_TYPES = (
+    "ping", "pong", "status", "error", "partial", "final", "translation",
+    "translation_partial", "host_status", "user_left", "participant_count",
+    "language_confirmed", "language_preference", "latency_report"
+)
+FIELDS = (
+    "type", "text", "timestamp", "segment_id", "confidence", "is_final", "seq",
+    "offset", "language", "original_text", "status", "user_id", "count",
+    "timing", "kind", "latency_ms"
+)
+_TYPE_TAGS = {name: tag for tag, name in enumerate(MESSAGE_TYPES)}
+_FIELD_TAGS = {name: tag for tag, name in enumerate(FIELDS)}
+
+Frame = Union[str, bytes]
+
+def encode_message(message: dict) -> str:
+    """Serialize a message to a JSON text frame, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+def _load_json(frame: str) -> dict:
+    return orjson.loads(frame) if orjson is not None else json.loads(frame)
+
+def _epoch_ms(timestamp: str):
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except ValueError:
+        return timestamp
+
+def encode_msgpack(message: dict) -> bytes:
+    """
+    Serialize a message to a binary MessagePack frame.
+
+    Known field names and message types become small integers, and ISO
+    timestamps become epoch milliseconds. Anything not in the tables is
+    kept as it is.
+    """
+    if msgpack is None:
+        raise ValueError("MessagePack frames require the msgpack package")
+    compact = {}
+    for key, value in message.items():
+        if key == "type":
+            value = _TYPE_TAGS.get(value, value)
+        elif key == "timestamp" and isinstance(value, str):
+            value = _epoch_ms(value)
+        compact[_FIELD_TAGS.get(key, key)] = value
+    return _packer().pack(compact)
+
+_packers = threading.local()
+
+def _packer() -> "msgpack.Packer":
+    """A reusable Packer for this thread (creating one per message costs more than packing)."""
+    packer = getattr(_packers, "packer", None)
+    if packer is None:
+        packer = _packers.packer = msgpack.Packer()
+    return packer
+
+def decode_msgpack(frame: bytes) -> dict:
+    """Expand a MessagePack frame from a client back into a message dict."""
+    if msgpack is None:
+        raise ValueError("MessagePack frames require the msgpack package")
+    message = {}
+    for key, value in msgpack.unpackb(frame, strict_map_key=False).items():
+        if isinstance(key, int) and 0 <= key < len(FIELDS):
+            key = FIELDS[key]
+        if key == "type" and isinstance(value, int) and 0 <= value < len(MESSAGE_TYPES):
+            value = MESSAGE_TYPES[value]
+        message[key] = value
+    return message
+
+def negotiate(offered: Iterable[str]) -> Tuple[Optional[str], str]:
+    """
+    Choose the wire protocol for a new connection.
+
+    Args:
+        offered (Iterable[str]): Subprotocols from the client's handshake, in its order of preference
+
+    Returns:
+        (subprotocol to accept or None, JSON or MSGPACK)
+    """
+    for name in offered:
+        protocol = SUBPROTOCOLS.get(name)
+        if protocol == MSGPACK and msgpack is None:
+            continue
+        if protocol:
+            return name, protocol
+    return None, JSON
+
+class EncodedMessage:
+    """
+    One outbound message, encoded at most once per protocol.
+
+    A broadcast builds one of these and every recipient takes the frame
+    for its own protocol, so a room with both JSON and MessagePack guests
+    costs two encodes, not one per guest. Frames relayed from another node
+    arrive as JSON and are only re-encoded if a local recipient needs it.
+    """
+    __slots__ = ("type", "_message", "_json", "_msgpack")
+
+    def __init__(self, message: dict = None, json_frame: str = None, message_type: str = None):
+        self.type = message_type or (message.get("type") if message else None)
+        self._message = message
+        self._json = json_frame
+        self._msgpack: Optional[bytes] = None
+
+    @property
+    def json(self) -> str:
+        if self._json is None:
+            self._json = encode_message(self._message)
+        return self._json
+
+    def frame(self, protocol: str) -> Frame:
+        """The frame for a connection speaking protocol."""
+        if protocol == JSON:
+            return self.json
+        if self._msgpack is None:
+            if self._message is None:
+                self._message = _load_json(self._json)
+            self._msgpack = encode_msgpack(self._message)
+        return self._msgpack
+
+async def receive_message(websocket: WebSocket) -> dict:
+    """Receive one client message, whether sent as JSON text or a MessagePack binary frame."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("bytes") is not None:
+        return decode_msgpack(message["bytes"])
+    return _load_json(message["text"])